@@ -374,138 +374,305 @@
 
 
 
+import time
+script_started = time.perf_counter()  # Per-rerun script time, shown in the sidebar
+
 import streamlit as st
-import pytesseract
-from PIL import Image
-import cv2
-import numpy as np
-from pydrive.auth import GoogleAuth
-from pydrive.drive import GoogleDrive
 import os
-import time
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import base64
+import collections
+import mimetypes
+from google_clients import authenticate_google_sheets, get_drive
+from ocr_cache import OCRCache
+from presets import PRESETS
+from document_pages import document_page_count, is_multipage_document, iter_document_pages
+# The OCR stack (OpenCV, Tesseract bindings and the modules built on them) is imported where an
+# upload is handled, so a cold start without an upload never loads it. Streamlit already loads
+# NumPy and PIL itself.
+from ocr_client import OCRServiceClient
+from drive_uploader import DriveUploadQueue
+from folder_index import FolderIndex
+from submission_spool import SpoolDispatcher, SubmissionSpool
+import metrics
+import profiling
 
 
 st.set_page_config(layout="wide")  # Enables wide mode
 
-# Initialize Google Drive Authentication
-gauth = GoogleAuth()
-gauth.LoadCredentialsFile("mycreds.txt")  # Load saved credentials 
-
-if gauth.credentials is None:
-    gauth.LocalWebserverAuth()  # Authenticate manually
-elif gauth.access_token_expired:
-    gauth.Refresh()  
-else:
-    gauth.Authorize()  # Use existing credentials
-
-gauth.SaveCredentialsFile("mycreds.txt")  # Save credentials
-drive = GoogleDrive(gauth)
-
-#Authenticate Google Sheets
-def authenticate_google_sheets():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-    client = gspread.authorize(creds)
-    return client
-
-# Function to Upload Errors & Rating to Google Sheets
-def upload_to_google_sheets(ref_number, rating, errors):
-    try:
-        client = authenticate_google_sheets()
-        sheet = client.open("OCR_Extraction_Records").sheet1  
-        sheet.append_row([ref_number, rating, errors])  
-        #st.success("✅ Data successfully uploaded to Google Sheets!")
-    except Exception as e:
-        # Remove the error message to suppress it, but you can log it if needed
-        print(f"Error uploading to Google Sheets: {str(e)}")
-        
-# Preprocess Image for OCR
-def preprocess_image(image):
-    gray = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)  # Binarization
-    return Image.fromarray(thresh)
-
-# OCR Function
-def extract_text_tesseract(image):
-    return pytesseract.image_to_string(image)
-
-
-def upload_to_drive(text, ref_number, uploaded_file):
-    parent_folder_id = '1SXT8l8R1i3LktVSxU5mosdU5TczIVT_F'  
-
-    folder_query = f"title='{ref_number}' and '{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-    folder_list = drive.ListFile({'q': folder_query}).GetList()
-
-    if folder_list:
-        folder_id = folder_list[0]['id']  
+# Google Drive and Sheets clients are created on first Submit (see google_clients.py),
+# not on every rerun
+
+# Prometheus Metrics (set METRICS_PORT to serve /metrics; Streamlit itself can't add routes)
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("METRICS_PORT")
+    return metrics.start_http_server(int(port)) if port else None
+
+start_metrics_server()
+
+# OCR Result Cache (shared by all sessions, optional SQLite tier via OCR_CACHE_PATH)
+@st.cache_resource
+def get_ocr_cache():
+    max_bytes = int(os.environ.get("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    return OCRCache(max_bytes=max_bytes, disk_path=os.environ.get("OCR_CACHE_PATH"))
+
+# Batch OCR Process Pool (one per server process, sized to the CPU count)
+@st.cache_resource
+def get_ocr_pool():
+    from batch_ocr import create_ocr_pool
+    return create_ocr_pool()
+
+
+# Google Drive Upload Queue (shared by all sessions; uploads run in the background)
+PARENT_FOLDER_ID = '1SXT8l8R1i3LktVSxU5mosdU5TczIVT_F'
+
+@st.cache_resource
+def get_upload_queue():
+    # Folder ids are cached per reference number; DRIVE_FOLDER_INDEX_PATH adds a SQLite mirror
+    # get_drive is passed uncalled so Drive authenticates on the first upload, not here
+    folder_index = FolderIndex(get_drive, sqlite_path=os.environ.get("DRIVE_FOLDER_INDEX_PATH"))
+    return DriveUploadQueue(get_drive, PARENT_FOLDER_ID, folder_index=folder_index)
+
+def drive_files(text, data, file_stem, extension=".png", rich=None):
+    """Builds the in-memory (title, bytes, mime type) list for one page, plus the PDF and JSON of a RichResult."""
+    mime_type = mimetypes.guess_type(f"{file_stem}{extension}")[0] or "application/octet-stream"
+    files = [
+        (f"{file_stem}_extracted_text.txt", text.encode("utf-8"), "text/plain"),
+        (f"{file_stem}{extension}", data, mime_type),
+    ]
+    if rich is not None:
+        files += [
+            (f"{file_stem}_searchable.pdf", rich.pdf, "application/pdf"),
+            (f"{file_stem}_ocr.json", rich.to_json(), "application/json"),
+        ]
+    return files
+
+# Near-Duplicate Index (re-saved or re-compressed copies of earlier uploads; NEAR_DUPLICATE_INDEX_PATH adds a SQLite mirror)
+@st.cache_resource
+def get_duplicate_index():
+    from near_duplicates import NearDuplicateIndex
+    return NearDuplicateIndex(sqlite_path=os.environ.get("NEAR_DUPLICATE_INDEX_PATH"))
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_image_hashes(data):
+    from near_duplicates import image_hashes
+    return image_hashes(data)  # None for PDFs and anything else OpenCV can't decode
+
+def reuse_near_duplicate(data, config_id):
+    """Returns (text, distance) from a near-identical earlier upload OCR'd with the same settings, or None."""
+    hashes = cached_image_hashes(data)
+    match = hashes and get_duplicate_index().find(hashes, "ocr", config_id)
+    if not match:
+        return None
+    text = get_ocr_cache().get(match[1])
+    return (text, match[0]) if text is not None else None
+
+def remember_ocr(data, config_id, cache_key):
+    hashes = cached_image_hashes(data)
+    if hashes:
+        get_duplicate_index().add(hashes, "ocr", config_id, cache_key)
+
+@st.cache_resource
+def get_delivered_images():
+    """
+    (ref number, meta images) of Drive deliveries not yet in the duplicate index. The spool dispatcher
+    fills it from its worker thread, where st.cache_resource always misses and can't reach the index.
+    """
+    return collections.deque()
+
+def index_delivered_images():
+    delivered = get_delivered_images()
+    while delivered:
+        ref_number, images = delivered.popleft()
+        for *hashes, title in images:
+            phash, dhash, signature = (hashes + [None])[:3]  # Submissions spooled before signatures have none
+            signature = base64.b64decode(signature) if signature else None
+            get_duplicate_index().add((phash, dhash, signature), "upload", ref_number, title)
+
+def uploaded_duplicate(data, ref_number):
+    """Title of an image with the same content already uploaded for this reference number, or None."""
+    index_delivered_images()
+    hashes = cached_image_hashes(data)
+    match = hashes and get_duplicate_index().find(hashes, "upload", ref_number)
+    return match[1] if match else None
+
+# Submission Spool (every Submit is committed to local SQLite first; a background dispatcher
+# delivers it to Sheets and Drive with retries, surviving outages and restarts)
+@st.cache_resource
+def get_submission_spool():
+    spool = SubmissionSpool(os.environ.get("SUBMISSION_SPOOL_PATH", "submission_spool.sqlite3"))
+    spool.import_jsonl_rows(os.environ.get("SHEETS_SPOOL_PATH", "sheets_spool.jsonl"))  # Rows from the old Sheets spool
+    return spool
+
+@st.cache_resource
+def get_spool_dispatcher():
+    def open_worksheet():
+        return authenticate_google_sheets().open("OCR_Extraction_Records").sheet1
+
+    delivered = get_delivered_images()
+
+    def remember_uploads(delivery):
+        delivered.append((delivery.ref_number, delivery.payload["meta"]["images"]))
+
+    return SpoolDispatcher(get_submission_spool(), open_worksheet, get_upload_queue(), on_drive_done=remember_uploads)
+
+get_spool_dispatcher()  # Delivers anything spooled before a restart without waiting for a new Submit
+
+def submit_to_spool(ref_number, rating, errors, files, images=()):
+    """
+    Durably records the Sheets row and Drive files of one submission and returns at once.
+    `images` are (bytes, title) pairs remembered as uploaded once Drive has them.
+    """
+    meta = {"images": []}
+    for data, title in images:
+        hashes = cached_image_hashes(data)
+        if hashes:
+            phash, dhash, signature = hashes
+            meta["images"].append((phash, dhash, base64.b64encode(signature).decode("ascii"), title))
+    key = get_submission_spool().submit(ref_number, [ref_number, rating, errors], files, meta=meta)
+    get_spool_dispatcher().wake()
+    st.session_state.setdefault("submissions", []).append((ref_number, key))
+    return key
+
+# Remote OCR Service (set OCR_SERVICE_URL to OCR on ocr_service.py instead of in this process)
+@st.cache_resource
+def get_ocr_client():
+    service_url = os.environ.get("OCR_SERVICE_URL")
+    return OCRServiceClient(service_url) if service_url else None
+
+# Crop / rotate: the decoded page and its preprocessing stay in the session, so an adjustment
+# re-OCRs the adjusted region without decoding or re-thresholding the whole image
+def get_edit_session(uploaded_file, stages):
+    from ocr_pipeline import starts_grayscale
+    from page_edits import EditSession
+    key = (uploaded_file.file_id, starts_grayscale(stages))
+    cached = st.session_state.get("edit_session")
+    if cached is None or cached[0] != key:
+        cached = st.session_state["edit_session"] = (key, EditSession(uploaded_file.getvalue(), grayscale=key[1]))
+    return cached[1]
+
+def reset_adjustments():
+    st.session_state["rotation"] = 0
+    st.session_state["adjust_version"] = st.session_state.get("adjust_version", 0) + 1  # Fresh crop sliders
+
+def rotate(quarter_turns):
+    st.session_state["rotation"] = (st.session_state.get("rotation", 0) + quarter_turns) % 4
+
+# Batch OCR: fan pages out over the process pool and stream results as they finish
+def run_batch_ocr(uploaded_files, preset, lang=None):
+    from batch_ocr import iter_batch_inputs, run_batch
+    from ocr_pipeline import TESSERACT_CONFIG
+    metrics.inc("ocr_requests_total", mode="batch")
+    stages = PRESETS[preset]
+    ocr_cache = get_ocr_cache()
+    items = list(iter_batch_inputs(uploaded_files))
+    texts = [None] * len(items)
+    cache_keys = []
+    config_id = ocr_cache.make_key(b"", preprocess=stages, tesseract=TESSERACT_CONFIG, lang=lang)
+    for index, (name, data) in enumerate(items):
+        cache_key = ocr_cache.make_key(data, preprocess=stages, tesseract=TESSERACT_CONFIG, lang=lang)
+        cache_keys.append(cache_key)
+        texts[index] = ocr_cache.get(cache_key)
+        if texts[index] is None:
+            reused = reuse_near_duplicate(data, config_id)
+            if reused:
+                texts[index] = reused[0]
+                ocr_cache.put(cache_key, reused[0])
+
+    progress = st.progress(0.0, text=f"OCR 0/{len(items)} pages")
+    done = 0
+
+    def show_result(index):
+        nonlocal done
+        done += 1
+        progress.progress(done / len(items), text=f"OCR {done}/{len(items)} pages")
+        with st.expander(items[index][0]):
+            st.text(texts[index])
+
+    for index, text in enumerate(texts):
+        if text is not None:
+            show_result(index)
+
+    pending = [(index, items[index][1]) for index, text in enumerate(texts) if text is None]
+    ocr_client = get_ocr_client()
+    if not pending:
+        results = []  # Every page was cached; nothing to send
+    elif ocr_client:
+        service_files = [(items[index][0], data) for index, data in pending]
+        results = (
+            (pending[position][0], text, error)
+            for position, text, error in ocr_client.iter_batch(service_files, preset, lang)
+        )
     else:
-        folder_metadata = {
-            'title': ref_number,
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [{'id': parent_folder_id}]
-        }
-        folder = drive.CreateFile(folder_metadata)
-        folder.Upload()
-        folder_id = folder['id']
-
-    def safe_delete(file_path):
-        """Tries to delete a file safely by closing processes and retrying."""
-        for _ in range(3):  # Retry up to 3 times
-            try:
-                os.remove(file_path)
-                return  # Exit loop if successful
-            except PermissionError:
-                time.sleep(1)  # Wait before retrying
-        print(f"Failed to delete {file_path} after multiple attempts.")
-
-    # **Upload Extracted Text**
-    text_file_path = f"{ref_number}_extracted_text.txt"
-    with open(text_file_path, "w", encoding="utf-8") as file:
-        file.write(text)
-    text_file_drive = drive.CreateFile({'title': f"{ref_number}_extracted_text.txt", 'parents': [{'id': folder_id}]})
-    text_file_drive.SetContentFile(text_file_path)
-    text_file_drive.Upload()
-    text_file_drive = None  # Release file
-    time.sleep(1)  # Ensure file is released
-    safe_delete(text_file_path)  # Try deleting safely
-
-    # # **Upload Errors**
-    # error_file_path = f"{ref_number}_errors.txt"
-    # with open(error_file_path, "w", encoding="utf-8") as file:
-    #     file.write(errors)
-    # error_file_drive = drive.CreateFile({'title': f"{ref_number}_errors.txt", 'parents': [{'id': folder_id}]})
-    # error_file_drive.SetContentFile(error_file_path)
-    # error_file_drive.Upload()
-    # error_file_drive = None  # Release file
-    # time.sleep(1)
-    # safe_delete(error_file_path)
-
-    # **Upload Image**
-    image_file_path = f"{ref_number}.png"
-    with open(image_file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    image_file_drive = drive.CreateFile({'title': f"{ref_number}.png", 'parents': [{'id': folder_id}]})
-    image_file_drive.SetContentFile(image_file_path)
-    image_file_drive.Upload()
-    image_file_drive = None  # Release file
-    time.sleep(1)
-    safe_delete(image_file_path)
-
-    # # **Upload Rating**
-    # rating_file_path = f"{ref_number}_rating.txt"
-    # with open(rating_file_path, "w", encoding="utf-8") as file:
-    #     file.write(f"User Rating: {rating}/5")
-    # rating_file_drive = drive.CreateFile({'title': f"{ref_number}_rating.txt", 'parents': [{'id': folder_id}]})
-    # rating_file_drive.SetContentFile(rating_file_path)
-    # rating_file_drive.Upload()
-    # rating_file_drive = None  # Release file
-    # time.sleep(1)
-    # safe_delete(rating_file_path)
-
-    # **Refresh app after upload**
-    st.rerun()
+        results = run_batch(get_ocr_pool(), pending, stages, lang)
+
+    for index, text, error in results:
+        if error:
+            st.error(f"OCR failed for {items[index][0]}: {error}")
+            text = ""
+        else:
+            ocr_cache.put(cache_keys[index], text)
+            remember_ocr(items[index][1], config_id, cache_keys[index])
+        texts[index] = text
+        show_result(index)
+
+    return [(name, data, text) for (name, data), text in zip(items, texts)]
+
+# PDF / TIFF OCR: decode and OCR one page at a time, showing text as each page finishes
+def run_document_ocr(uploaded_file, preset, lang=None):
+    from ocr_pipeline import TESSERACT_CONFIG, extract_text_tesseract, preprocess_image
+    metrics.inc("ocr_requests_total", mode="document")
+    stages = PRESETS[preset]
+    ocr_cache = get_ocr_cache()
+    data = uploaded_file.getvalue()
+
+    ocr_client = get_ocr_client()
+    if ocr_client:
+        # The service OCRs the whole document in one call; reruns reuse its text instead of sending it again
+        cache_key = ocr_cache.make_key(data, preprocess=stages, tesseract=TESSERACT_CONFIG, lang=lang, document="service")
+        extracted_text = ocr_cache.get(cache_key)
+        if extracted_text is None:
+            pages = ocr_client.ocr(data, uploaded_file.name, preset, lang)
+            extracted_text = "\n\n".join(f"--- Page {number} ---\n{text}" for number, text in enumerate(pages, 1))
+            ocr_cache.put(cache_key, extracted_text)
+        st.text_area("Extracted Text", extracted_text, height=800)
+        return extracted_text
+
+    # Cache keys only need the page count, so a rerun renders nothing but the previewed page
+    page_count = document_page_count(data, uploaded_file.name)
+    cache_keys = [
+        ocr_cache.make_key(data, page=page_number, preprocess=stages, tesseract=TESSERACT_CONFIG, lang=lang)
+        for page_number in range(1, page_count + 1)
+    ]
+    texts = [ocr_cache.get(cache_key) for cache_key in cache_keys]
+    preview_number = st.slider("Preview page", 1, page_count, 1) if page_count > 1 else 1
+
+    col1, col2 = st.columns(2)
+    with col1:
+        page_preview = st.empty()
+    with col2:
+        text_preview = st.empty()
+
+    def joined_text():
+        return "\n\n".join(f"--- Page {number} ---\n{text}" for number, text in enumerate(texts, 1) if text is not None)
+
+    pending = {page_number for page_number, text in enumerate(texts, 1) if text is None}
+    preview_page = None
+    for page_number, page in iter_document_pages(data, uploaded_file.name, pages=pending | {preview_number}):
+        if page_number == preview_number:
+            preview_page = page  # Kept for the final preview, so at most two pages are held
+        if page_number in pending:
+            with profiling.profile_if_slow("document_page"):
+                texts[page_number - 1] = extract_text_tesseract(preprocess_image(page, stages), lang=lang)
+            ocr_cache.put(cache_keys[page_number - 1], texts[page_number - 1])
+            page_preview.image(page, caption=f"Page {page_number}", use_column_width=True)
+            text_preview.text(joined_text())
+
+    if preview_page is not None:
+        page_preview.image(preview_page, caption=f"Page {preview_number} of {page_count}", use_column_width=True)
+    extracted_text = joined_text()
+    text_preview.text_area("Extracted Text", extracted_text, height=800)
+    return extracted_text
 
 # Streamlit UI
 st.markdown(
@@ -513,23 +680,202 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-uploaded_file = st.file_uploader("Upload an Image (PNG, JPG, JPEG)", type=["png", "jpg", "jpeg"])
+# Delivery status for this session's submissions
+if st.session_state.get("submissions"):
+    with st.sidebar:
+        st.subheader("Submissions")
+        spool = get_submission_spool()
+        status_icons = {"pending": "⏳", "running": "⬆️", "done": "✅", "dead": "❌"}
+        service_names = {"sheets": "Google Sheets", "drive": "Google Drive"}
+        for ref_number, key in reversed(st.session_state["submissions"]):
+            for kind, (status, attempts, error) in sorted(spool.status(key).items()):
+                retries = f" (attempt {attempts})" if attempts > 1 and status != "done" else ""
+                st.write(f"{status_icons[status]} {ref_number} → {service_names[kind]}: {status}{retries}")
+                if error and status != "done":
+                    st.caption(error)
+        backlog = sum(count for (_, status), count in spool.counts().items() if status in ("pending", "running"))
+        if backlog:
+            st.caption(f"{backlog} deliveries waiting; they are kept on disk until Google accepts them.")
+        submits = metrics.total("drive_submits_total")
+        if submits:
+            st.caption(f"Drive API calls per submit: {metrics.total('drive_api_calls_total') / submits:.1f}")
+        st.button("Refresh Upload Status")
+
+# Preprocessing preset ("classic" is the original fixed threshold; "adaptive" suits phone photos)
+preprocess_preset = st.selectbox("Preprocessing", list(PRESETS), index=0)
+preprocess_stages = PRESETS[preprocess_preset]
+
+# OCR language ("Auto-detect" runs Tesseract's script detection and loads only the models a page needs)
+LANGUAGE_CHOICES = {
+    "Auto-detect": "auto",
+    "English": "eng",
+    "Sinhala": "sin",
+    "Tamil": "tam",
+    "Sinhala + English": "sin+eng",
+    "Tamil + English": "tam+eng",
+    "Sinhala + Tamil + English": "sin+tam+eng",
+}
+ocr_lang = LANGUAGE_CHOICES[st.selectbox("Language", list(LANGUAGE_CHOICES), index=0)]
+
+region_mode = st.checkbox("Region-parallel OCR (split large pages into text blocks across CPU cores)")
+
+rich_mode = st.checkbox("Rich output (word boxes, confidences, searchable PDF and JSON, uploaded with the text)")
+
+# Re-OCR only the lines Tesseract is unsure of, within OCR_RETRY_BUDGET_SECONDS per page
+retry_mode = st.checkbox("Retry low-confidence lines with alternate preprocessing")
+RETRY_BUDGET_SECONDS = float(os.environ.get("OCR_RETRY_BUDGET_SECONDS", 5))
+
+batch_mode = st.checkbox("Batch mode (many images or a ZIP for one reference number)")
+
+uploaded_file = None
+if batch_mode:
+    uploaded_files = st.file_uploader(
+        "Upload Images or a ZIP (PNG, JPG, JPEG, ZIP)",
+        type=["png", "jpg", "jpeg", "zip"],
+        accept_multiple_files=True,
+    )
+    if uploaded_files:
+        st.session_state["batch_results"] = run_batch_ocr(uploaded_files, preprocess_preset, ocr_lang)
+else:
+    uploaded_file = st.file_uploader(
+        "Upload an Image or Document (PNG, JPG, JPEG, PDF, TIFF)",
+        type=["png", "jpg", "jpeg", "pdf", "tif", "tiff"],
+    )
 
-if uploaded_file:
-    img = Image.open(uploaded_file)
-    preprocessed_img = preprocess_image(img)
-    extracted_text = extract_text_tesseract(preprocessed_img)
+if uploaded_file and is_multipage_document(uploaded_file.name):
+    extracted_text = run_document_ocr(uploaded_file, preprocess_preset, ocr_lang)
+    st.session_state["extracted_text"] = extracted_text
+
+elif uploaded_file:
+    import numpy as np
+    from ocr_pipeline import TESSERACT_CONFIG, extract_text_tesseract, read_header
+    from page_edits import FULL_BOX, adjusted_size
+    from quality_retry import ocr_with_retries
+    from region_ocr import ocr_page_regions
+    from rich_output import ocr_rich
+
+    if st.session_state.get("adjusting_file") != uploaded_file.file_id:
+        reset_adjustments()
+        st.session_state["adjusting_file"] = uploaded_file.file_id
+    with st.expander("Crop / rotate"):
+        col1, col2, col3 = st.columns(3)
+        col1.button("⟲ Rotate left", on_click=rotate, args=(1,))
+        col2.button("⟳ Rotate right", on_click=rotate, args=(-1,))
+        col3.button("Reset", on_click=reset_adjustments)
+        version = st.session_state["adjust_version"]
+        crop_x = st.slider("Keep from left to right (%)", 0, 100, (0, 100), key=f"crop_x_{version}")
+        crop_y = st.slider("Keep from top to bottom (%)", 0, 100, (0, 100), key=f"crop_y_{version}")
+    rotation = st.session_state["rotation"]
+    box = (crop_x[0] / 100, crop_y[0] / 100, crop_x[1] / 100, crop_y[1] / 100)
+    adjusted = rotation != 0 or box != FULL_BOX
+
+    ocr_cache = get_ocr_cache()
+    image_bytes = uploaded_file.getvalue()  # Shares the upload's buffer; nothing below copies it
+    ocr_config = dict(
+        preprocess=preprocess_stages, tesseract=TESSERACT_CONFIG, lang=ocr_lang,
+        regions=region_mode and not rich_mode, retry=retry_mode and not rich_mode,
+    )
+    if adjusted:
+        ocr_config["adjust"] = [rotation, box]
+    cache_key = ocr_cache.make_key(image_bytes, **ocr_config)
+    config_id = ocr_cache.make_key(b"", **ocr_config)
+    _, upload_size, _ = read_header(image_bytes)  # No pixels are decoded on a cache hit
+    original_size = adjusted_size(upload_size, rotation, box)  # Of the region being OCR'd
+
+    # Reruns and identical re-uploads skip preprocessing and Tesseract entirely
+    extracted_text = ocr_cache.get(cache_key)
+    rich_result = st.session_state.get("rich_result")
+    if rich_mode and (rich_result is None or rich_result[0] != cache_key):
+        extracted_text = None  # The cache only holds text; boxes and the PDF need a Tesseract run
+    elif extracted_text is None:
+        # A re-saved or re-compressed copy of an earlier upload reuses that upload's text
+        reused = reuse_near_duplicate(image_bytes, config_id)
+        if reused:
+            extracted_text = reused[0]
+            ocr_cache.put(cache_key, extracted_text)
+            st.session_state["near_duplicate"] = (cache_key, reused[1])
+    if extracted_text is None:
+        metrics.inc("ocr_requests_total", mode="single")
+        stage_timings = {}
+        ocr_client = get_ocr_client()
+        if ocr_client and not (rich_mode or retry_mode or adjusted):
+            pages = ocr_client.ocr(image_bytes, uploaded_file.name, preprocess_preset, ocr_lang)
+            extracted_text = "\n\n".join(pages)
+        else:
+            with profiling.profile_if_slow("single_image"):
+                # cv2.imdecode straight from the bytes (once per upload), then NumPy all the way to Tesseract
+                edit = get_edit_session(uploaded_file, preprocess_stages)
+                if retry_mode and not rich_mode:
+                    # Preprocesses and OCRs the region itself, then re-OCRs weak lines from the decoded pixels
+                    extracted_text, retry_report = ocr_with_retries(
+                        edit.source_region(rotation, box), preprocess_stages, budget=RETRY_BUDGET_SECONDS,
+                        timings=stage_timings, source_dpi=edit.dpi, lang=ocr_lang,
+                    )
+                    st.session_state["retry_report"] = (cache_key, retry_report)
+                else:
+                    transform = np.eye(3)  # Upload pixels -> OCR'd pixels, for the rich output
+                    preprocessed_img = edit.preprocessed(preprocess_stages, rotation, box, stage_timings, transform)
+                    if rich_mode:
+                        # One Tesseract run gives the text, word boxes and the text layer laid over the upload
+                        rich = ocr_rich(
+                            preprocessed_img, TESSERACT_CONFIG, upload_size, lang=ocr_lang,
+                            source=image_bytes, transform=transform,
+                        )
+                        st.session_state["rich_result"] = (cache_key, rich)
+                        extracted_text = rich.text
+                    elif region_mode:
+                        extracted_text = ocr_page_regions(get_ocr_pool(), preprocessed_img, lang=ocr_lang)
+                    else:
+                        extracted_text = extract_text_tesseract(preprocessed_img, lang=ocr_lang)
+        ocr_cache.put(cache_key, extracted_text)
+        remember_ocr(image_bytes, config_id, cache_key)
+        st.session_state["stage_timings"] = (cache_key, stage_timings)
+
+    # Timings belong to the run that produced this image's text; a cache hit has none to show
+    timings = st.session_state.get("stage_timings")
+    if timings and timings[0] == cache_key and timings[1]:
+        with st.expander("Preprocessing stage timings"):
+            for stage, seconds in timings[1].items():
+                st.write(f"{stage}: {seconds * 1000:.1f} ms")
 
     # Get image height for text area
-    img_width, img_height = img.size
+    img_width, img_height = original_size
     text_area_height = min(img_height, 800)
 
     col1, col2 = st.columns(2)
     with col1:
-        st.image(uploaded_file, caption="Uploaded Image", use_container_width=True)
+        if adjusted:
+            preview = get_edit_session(uploaded_file, preprocess_stages).preview(rotation, box)
+            st.image(preview, caption=f"Adjusted Image ({original_size[0]}×{original_size[1]} px)", use_column_width=True)
+        else:
+            st.image(uploaded_file, caption=f"Uploaded Image ({original_size[0]}×{original_size[1]} px)", use_column_width=True)
     with col2:
         st.text_area("Extracted Text", extracted_text, height=text_area_height)
 
+    near_duplicate = st.session_state.get("near_duplicate")
+    if near_duplicate and near_duplicate[0] == cache_key:
+        st.info(f"Near-identical to an earlier upload ({near_duplicate[1]} of 1024 hash bits differ); reused its OCR text.")
+
+    retry_report = st.session_state.get("retry_report")
+    if retry_mode and not rich_mode and retry_report and retry_report[0] == cache_key:
+        report = retry_report[1]
+        st.caption(
+            f"Retried {report['retried_lines']} of {report['low_confidence_lines']} low-confidence lines "
+            f"({report['improved_lines']} improved, {report['attempts']} attempts, {report['seconds']:.1f} s); "
+            f"mean confidence {report['mean_confidence_before']:.0f}% → {report['mean_confidence_after']:.0f}% "
+            f"(language: {report['lang']})"
+            + (" — time budget reached" if report["budget_exhausted"] else "")
+        )
+
+    if rich_mode:
+        rich = st.session_state["rich_result"][1]
+        st.caption(f"{len(rich.words)} words, mean confidence {rich.words.mean_confidence():.0f}%")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download Searchable PDF", rich.pdf, file_name="ocr_searchable.pdf", mime="application/pdf")
+        with col2:
+            st.download_button("Download JSON", rich.to_json(), file_name="ocr.json", mime="application/json")
+
     st.session_state["extracted_text"] = extracted_text
 
 # Text area for errors
@@ -544,15 +890,58 @@ with col1:
     ref_number = st.text_input("Enter Reference Number", max_chars=10)
 
 
+# Images already uploaded for this reference (re-saved or re-compressed copies of the same page) are only
+# left out of the upload when the user confirms it: a false match would silently lose a document
+duplicate_titles = {}  # Position in the batch (0 for a single image) -> (label shown, title it duplicates)
+if ref_number:
+    if batch_mode:
+        images = [(name, data) for name, data, _ in st.session_state.get("batch_results", [])]
+    elif uploaded_file and not is_multipage_document(uploaded_file.name):
+        images = [(uploaded_file.name, uploaded_file.getvalue())]
+    else:
+        images = []
+    for position, (name, data) in enumerate(images):
+        title = uploaded_duplicate(data, ref_number)
+        if title:
+            # ZIP members from different folders can share a name, so batch files are also named by position
+            duplicate_titles[position] = (f"{name} (file {position + 1})" if batch_mode else name, title)
+    for name, title in duplicate_titles.values():
+        st.warning(f"⚠ {name} looks like {title}, already uploaded for {ref_number}.")
+    if duplicate_titles and not st.checkbox("Don't upload these again (Submit still saves the rating)", value=False):
+        duplicate_titles = {}
+
 # **Disable Button if Required Fields are Empty**
 if not ref_number or rating is None:
     st.warning("⚠ Please enter a Reference Number and select a Rating to proceed.")
     st.button("Save & Upload to Google Drive", disabled=True)
 else:
     if st.button("Submit"):
-        upload_to_google_sheets(ref_number, rating, errors_text)  # Upload errors & rating to Google Sheets
-        upload_to_drive(st.session_state["extracted_text"], ref_number, uploaded_file)  # Upload text & image to Drive
-
-        # Clear session state values and refresh
+        files, images = [], []
+        if batch_mode:
+            for index, (name, data, text) in enumerate(st.session_state.get("batch_results", []), start=1):
+                if index - 1 in duplicate_titles:
+                    continue
+                extension = os.path.splitext(name)[1].lower()
+                files += drive_files(text, data, f"{ref_number}_{index:03d}", extension)
+                images.append((data, f"{ref_number}_{index:03d}{extension}"))
+        elif uploaded_file and is_multipage_document(uploaded_file.name):
+            extension = os.path.splitext(uploaded_file.name)[1].lower()
+            files = drive_files(st.session_state["extracted_text"], uploaded_file.getvalue(), ref_number, extension)
+        elif uploaded_file and 0 not in duplicate_titles:
+            rich = st.session_state["rich_result"][1] if rich_mode and st.session_state.get("rich_result") else None
+            files = drive_files(st.session_state["extracted_text"], uploaded_file.getvalue(), ref_number, rich=rich)  # Text, image and any rich output
+            images = [(uploaded_file.getvalue(), f"{ref_number}.png")]
+        # Errors & rating for Google Sheets and files for Google Drive, spooled to local disk in one transaction
+        submit_to_spool(ref_number, rating, errors_text, files, images)
+
+        # Clear session state values (keeping submission status) and refresh
+        submissions = st.session_state.get("submissions", [])
         st.session_state.clear()  # Clears session data after upload
-        st.rerun()  # Refresh app after upload
\ No newline at end of file
+        st.session_state["submissions"] = submissions
+        st.rerun()  # Refresh app after upload
+
+# Script timing (every widget interaction reruns this whole file)
+script_seconds = time.perf_counter() - script_started
+metrics.inc("script_runs_total")
+metrics.inc("script_seconds_total", script_seconds)
+st.sidebar.caption(f"Script run: {script_seconds * 1000:.0f} ms")
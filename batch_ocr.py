@@ -0,0 +1,94 @@
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+import profiling
+from ocr_pipeline import ocr_image_bytes
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def _init_worker():
+    # One Tesseract thread per worker; the pool already provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def create_ocr_pool(max_workers=None):
+    """
+    Creates a process pool sized to the CPU count. Each worker imports its own
+    preprocessing -> Tesseract pipeline, so pages never contend for the GIL.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),  # Safe to start from Streamlit's threads
+        initializer=_init_worker,
+    )
+
+
+def expand_upload(name, data):
+    """Yields (name, bytes) for an uploaded image, or for every image inside a ZIP."""
+    if not name.lower().endswith(".zip"):
+        yield name, data
+        return
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for member in sorted(archive.namelist()):
+            if member.endswith("/") or not member.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            yield os.path.basename(member), archive.read(member)
+
+
+def run_in_worker(func, *args):
+    """
+    Pool entry point. Worker exceptions are re-raised as plain RuntimeErrors
+    because some (e.g. pytesseract's TesseractNotFoundError) cannot be
+    unpickled and would otherwise break the whole pool.
+    """
+    try:
+        return func(*args)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def run_measured(func, *args):
+    """
+    Pool entry point that returns (result, error, metrics) instead of raising,
+    where metrics is what the call recorded in the worker (spans included,
+    even for failed calls) for the parent to metrics.merge().
+    Slow calls are profiled when OCR_PROFILE_DIR is set (see profiling.py).
+    """
+    result, error = None, None
+    with profiling.profile_if_slow(func.__name__):
+        try:
+            result = run_in_worker(func, *args)
+        except RuntimeError as e:
+            error = str(e)
+    return result, error, metrics.drain()
+
+
+def iter_batch_inputs(uploaded_files):
+    """Yields (name, bytes) for every uploaded image, expanding ZIP archives."""
+    for uploaded_file in uploaded_files:
+        yield from expand_upload(uploaded_file.name, uploaded_file.getvalue())
+
+
+def run_batch(pool, items, stages=None, lang=None):
+    """
+    Fans (item_id, bytes) items out over the pool and yields
+    (item_id, text, error) as each page finishes, in completion order.
+    """
+    futures = {pool.submit(run_measured, ocr_image_bytes, data, stages, lang): item_id for item_id, data in items}
+    for future in as_completed(futures):
+        item_id = futures[future]
+        try:
+            text, error, worker_metrics = future.result()
+        except Exception as e:  # The worker process died
+            text, error, worker_metrics = None, str(e), None
+        if worker_metrics:
+            metrics.merge(worker_metrics)
+        if error:
+            metrics.inc("ocr_errors_total", mode="batch")
+        yield item_id, text, error
@@ -0,0 +1,31 @@
+"""Character and word error rates against ground truth."""
+
+
+def edit_distance(reference, hypothesis):
+    """Levenshtein distance between two sequences (strings or word lists)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,  # Deletion
+                current[j - 1] + 1,  # Insertion
+                previous[j - 1] + (ref_item != hyp_item),  # Substitution
+            ))
+        previous = current
+    return previous[-1]
+
+
+def normalize(text):
+    """Collapses whitespace so layout differences don't count as errors."""
+    return " ".join(text.split())
+
+
+def char_error_rate(reference, hypothesis):
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    return edit_distance(reference, hypothesis) / max(len(reference), 1)
+
+
+def word_error_rate(reference, hypothesis):
+    reference, hypothesis = normalize(reference).split(), normalize(hypothesis).split()
+    return edit_distance(reference, hypothesis) / max(len(reference), 1)
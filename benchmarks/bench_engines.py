@@ -0,0 +1,79 @@
+"""
+Compares per-image latency and throughput of the OCR engines on one corpus.
+
+    python benchmarks/bench_engines.py                 # synthetic corpus
+    python benchmarks/bench_engines.py --corpus scans/ # your own images
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import render_page  # noqa: E402
+from ocr_engine import PytesseractEngine, TesserocrEngine  # noqa: E402
+from ocr_pipeline import preprocess_image  # noqa: E402
+
+
+def synthetic_corpus(count, seed=0):
+    """Small receipt-like images; small inputs are where process start-up dominates."""
+    for index in range(count):
+        yield render_page(seed + index, width=600, height=200, font_size=20, background="white")[0]
+
+
+def load_corpus(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff")):
+            yield Image.open(os.path.join(directory, name)).convert("RGB")
+
+
+def run_engine(engine, images):
+    latencies = []
+    started = time.perf_counter()
+    for image in images:
+        t0 = time.perf_counter()
+        engine.image_to_string(image)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "engine": engine.name,
+        "images": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "images_per_sec": len(latencies) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directory of images (default: synthetic)")
+    parser.add_argument("--count", type=int, default=50, help="synthetic image count")
+    args = parser.parse_args()
+
+    images = list(load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count))
+    images = [preprocess_image(image) for image in images]
+
+    engines = [PytesseractEngine()]
+    try:
+        engines.append(TesserocrEngine(size=1))  # Same single-stream setup as pytesseract
+    except ImportError:
+        print("tesserocr is not installed; benchmarking pytesseract only")
+
+    for engine in engines:
+        engine.image_to_string(images[0])  # Warm-up, excluded from the numbers
+        result = run_engine(engine, images)
+        print(
+            f"{result['engine']:>12}: {result['images']} images  "
+            f"mean {result['mean_ms']:.1f} ms  p50 {result['p50_ms']:.1f} ms  "
+            f"p95 {result['p95_ms']:.1f} ms  {result['images_per_sec']:.2f} images/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
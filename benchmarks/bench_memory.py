@@ -0,0 +1,88 @@
+"""
+Peak memory per request: the PIL path (decode_image -> preprocess_image ->
+PIL image) against the NumPy path (decode_array -> preprocess_array).
+
+    python benchmarks/bench_memory.py --preset classic
+
+Each path runs in a fresh interpreter. The number reported is how far the
+request pushed peak RSS above the process's steady state after imports and
+a warm-up, i.e. the extra memory one request needs. Tesseract is not run, so
+this measures the decode and preprocessing buffers only.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import render_page  # noqa: E402
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def child(path, input_path, preset):
+    from ocr_pipeline import decode_array, decode_image, preprocess_array, preprocess_image, starts_grayscale
+    from preprocessing import PRESETS
+
+    stages = PRESETS[preset]
+    with open(input_path, "rb") as source:
+        page_data = source.read()
+
+    def run(data):
+        if path == "pil":
+            image, _ = decode_image(data)
+            return preprocess_image(image, stages)
+        array, _, dpi = decode_array(data, grayscale=starts_grayscale(stages))
+        return preprocess_array(array, stages, source_dpi=dpi)
+
+    warm = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(warm, format="PNG")
+    run(warm.getvalue())  # Warm-up on a tiny image so library initialisation isn't counted
+
+    before = peak_rss_bytes()
+    started = time.perf_counter()
+    run(page_data)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"peak_increase_mb": (peak_rss_bytes() - before) / 2 ** 20, "seconds": elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", default="classic")
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "INPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.preset)
+        return
+
+    page, _ = render_page(0)  # A4 at 300 DPI, slightly off-white like a photo of paper
+    with tempfile.TemporaryDirectory() as directory:
+        for image_format in ("JPEG", "PNG"):
+            input_path = os.path.join(directory, f"page.{image_format.lower()}")
+            page.save(input_path, format=image_format, dpi=(300, 300))
+            for path in ("pil", "array"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--preset", args.preset, "--child", path, input_path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output)
+                print(
+                    f"{image_format:>4} {path:>5}: peak +{result['peak_increase_mb']:6.1f} MB  "
+                    f"{result['seconds'] * 1000:6.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares full-page OCR against region-parallel OCR on large synthetic pages
+with known text: wall-clock time per page and character/word error rate.
+
+    python benchmarks/bench_regions.py --pages 5 --workers 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accuracy import char_error_rate, word_error_rate  # noqa: E402
+from batch_ocr import create_ocr_pool  # noqa: E402
+from corpus import render_page  # noqa: E402
+from ocr_pipeline import extract_text_tesseract, preprocess_image  # noqa: E402
+from region_ocr import ocr_page_regions  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # A4 pages at 300 DPI with two columns of paragraphs, and their text
+    fixtures = [render_page(seed, columns=2, font_size=36, background="white") for seed in range(args.pages)]
+    pool = create_ocr_pool(args.workers)
+    pool.submit(len, []).result()  # Start the workers before timing
+
+    results = {"full-page": [], "region-parallel": []}
+    for image, truth in fixtures:
+        preprocessed = preprocess_image(image)
+
+        started = time.perf_counter()
+        full_text = extract_text_tesseract(preprocessed)
+        results["full-page"].append((time.perf_counter() - started, truth, full_text))
+
+        started = time.perf_counter()
+        region_text = ocr_page_regions(pool, preprocessed)
+        results["region-parallel"].append((time.perf_counter() - started, truth, region_text))
+
+    pool.shutdown()
+    for mode, runs in results.items():
+        seconds = [elapsed for elapsed, _, _ in runs]
+        cer = statistics.mean(char_error_rate(truth, text) for _, truth, text in runs)
+        wer = statistics.mean(word_error_rate(truth, text) for _, truth, text in runs)
+        print(
+            f"{mode:>16}: mean {statistics.mean(seconds):.2f} s/page  "
+            f"min {min(seconds):.2f} s  CER {cer:.3f}  WER {wer:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
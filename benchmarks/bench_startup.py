@@ -0,0 +1,110 @@
+"""
+Measures the Streamlit app's cold start and per-rerun script time, offline.
+
+    python benchmarks/bench_startup.py --reruns 20
+    python benchmarks/bench_startup.py --baseline d2e0b25   # Before and after
+
+Cold start is the first script run in a fresh interpreter (imports included).
+Reruns repeat the script in the same process, as a widget interaction would.
+Module-level Google authentication would show up in both numbers.
+
+--baseline also measures app.py as of that git revision. The original app
+authenticated Drive at import, so pydrive2's GoogleAuth is replaced with a
+mock there. Its library imports are still timed, but the credentials file
+I/O and any token refresh it did on every run are not, so the baseline
+numbers are a lower bound.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def mock_google_auth():
+    """Makes GoogleAuth a MagicMock, so a script that authenticates at import runs without credentials."""
+    from unittest import mock
+
+    import pydrive2
+    import pydrive2.auth
+    import pydrive2.drive
+
+    mock.patch("pydrive2.auth.GoogleAuth").start()
+    # The original app imported the unmaintained pydrive; pydrive2 is its drop-in fork
+    sys.modules.setdefault("pydrive", pydrive2)
+    sys.modules.setdefault("pydrive.auth", pydrive2.auth)
+    sys.modules.setdefault("pydrive.drive", pydrive2.drive)
+
+
+def measure(script, reruns, mock_auth=False):
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest, local_script_runner
+
+    sys.path.insert(0, ROOT)  # `streamlit run` puts the script's directory on sys.path; AppTest doesn't
+    # AppTest compiles the script afresh on every run; the server compiles it once and reuses the bytecode
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+    started = time.perf_counter()
+    if mock_auth:
+        mock_google_auth()  # Inside the timing: the original script imported pydrive at startup
+    app = AppTest.from_file(script, default_timeout=60).run()
+    cold = time.perf_counter() - started
+    if app.exception:
+        raise SystemExit(f"{script} raised: {app.exception[0].message}")
+
+    rerun_times = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - started)
+    return cold, rerun_times
+
+
+def run_child(label, script, reruns, mock_auth=False):
+    """Measures `script` in a fresh interpreter so the cold start includes every import."""
+    command = [sys.executable, __file__, "--child", "--script", script, "--reruns", str(reruns), "--label", label]
+    if mock_auth:
+        command.append("--mock-auth")
+    subprocess.run(command, cwd=ROOT, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--baseline", help="git revision whose app.py is measured first, for comparison")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--script", default=os.path.join(ROOT, "app.py"), help=argparse.SUPPRESS)
+    parser.add_argument("--label", default="current", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-auth", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.child:
+        if args.baseline:
+            source = subprocess.run(
+                ["git", "show", f"{args.baseline}:app.py"], cwd=ROOT, check=True, capture_output=True
+            ).stdout
+            with tempfile.TemporaryDirectory() as workdir:
+                script = os.path.join(workdir, "app.py")
+                with open(script, "wb") as f:
+                    f.write(source)
+                run_child(f"baseline {args.baseline} (GoogleAuth mocked)", script, args.reruns, mock_auth=True)
+        run_child("current", args.script, args.reruns)
+        return
+
+    cold, reruns = measure(args.script, args.reruns, args.mock_auth)
+    reruns.sort()
+    print(f"{args.label}")
+    print(f"  cold start: {cold * 1000:.0f} ms")
+    print(
+        f"  rerun: mean {statistics.mean(reruns) * 1000:.1f} ms  "
+        f"p50 {reruns[len(reruns) // 2] * 1000:.1f} ms  max {reruns[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Synthetic OCR corpus with known ground truth.
+
+Every sample varies font, text size, noise, skew and lighting, so speed and
+accuracy can be broken down by condition. Generation is deterministic for a
+given seed, which keeps benchmark runs comparable. render_page draws whole
+seeded pages for the benchmarks that need full-size scans.
+
+    python benchmarks/corpus.py --count 60 --out corpus/   # also writes .txt truth files
+"""
+import argparse
+import itertools
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+VOCABULARY = (
+    "invoice receipt total amount date reference number customer payment balance "
+    "account statement paid due tax subtotal cash card order item quantity price "
+    "Colombo Kandy Galle March April 2024 2025 LKR 1,250.00 17.50 No. 42 #1093"
+).split()
+
+FONT_NAMES = (
+    "DejaVuSans.ttf",
+    "DejaVuSerif.ttf",
+    "DejaVuSansMono.ttf",
+    "LiberationSans-Regular.ttf",
+    "LiberationSerif-Regular.ttf",
+    "Arial.ttf",
+    "Times New Roman.ttf",
+)
+SIZES = (18, 28, 40)
+NOISE_LEVELS = (0, 12)
+SKEW_ANGLES = (0.0, 3.0)
+LIGHTING = ("even", "gradient")
+
+
+def available_fonts():
+    """Installed TrueType fonts from FONT_NAMES, falling back to Pillow's built-in font."""
+    fonts = []
+    for name in FONT_NAMES:
+        try:
+            ImageFont.truetype(name, 12)
+            fonts.append(name)
+        except OSError:
+            continue
+    return fonts or ["default"]
+
+
+def load_font(name, size):
+    if name == "default":
+        return ImageFont.load_default(size=size)
+    return ImageFont.truetype(name, size)
+
+
+def render_sample(text_lines, font_name, size, noise, skew, lighting, rng):
+    font = load_font(font_name, size)
+    line_height = int(size * 1.6)
+    width = max(int(font.getlength(line)) for line in text_lines) + 2 * size
+    height = line_height * len(text_lines) + 2 * size
+
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(text_lines):
+        draw.text((size, size + index * line_height), line, fill=0, font=font)
+    if skew:
+        image = image.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    pixels = np.asarray(image, dtype=np.float32)
+    if lighting == "gradient":
+        # Darkening from left to right, like a phone photo lit from one side
+        pixels = pixels * np.linspace(1.0, 0.45, pixels.shape[1], dtype=np.float32)[None, :]
+    if noise:
+        pixels = pixels + np.random.default_rng(rng.randrange(2 ** 32)).normal(0, noise, pixels.shape)
+    gray = np.clip(pixels, 0, 255).astype(np.uint8)
+    return Image.fromarray(gray).convert("RGB")
+
+
+def render_page(seed, width=2480, height=3508, columns=1, font_size=None, background=(235, 232, 225)):
+    """
+    A page of paragraphs, A4 at 300 DPI by default. Font, type size (unless
+    given), margins, line spacing, line lengths and paragraph breaks all
+    follow from `seed`, so pages of different seeds differ in layout as well
+    as text. Returns (image, text): the paragraphs, each on one line,
+    separated by blank lines.
+    """
+    rng = random.Random(seed)
+    size = font_size or rng.choice((32, 36, 40, 44))
+    font = load_font(rng.choice(available_fonts()), size)
+    line_height = int(size * rng.uniform(1.3, 1.8))
+    margin_x, margin_y = width // 20, height // 20
+    gutter = margin_x
+    column_width = (width - 2 * margin_x - (columns - 1) * gutter) // columns
+    top = rng.randint(margin_y, 2 * margin_y)
+
+    image = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(image)
+    paragraphs = []
+    for column in range(columns):
+        left = margin_x + column * (column_width + gutter)
+        y, lines = top, []
+        while y + line_height <= height - margin_y:
+            if lines and rng.random() < 0.15:
+                paragraphs.append(" ".join(lines))  # Paragraph break
+                y, lines = y + line_height * rng.randint(1, 3), []
+                continue
+            limit = column_width * rng.uniform(0.5, 1.0)
+            words = [rng.choice(VOCABULARY)]
+            while True:
+                word = rng.choice(VOCABULARY)
+                if font.getlength(" ".join(words + [word])) > limit:
+                    break
+                words.append(word)
+            line = " ".join(words)
+            draw.text((left, y), line, fill=(30, 30, 30), font=font)
+            lines.append(line)
+            y += line_height
+        if lines:
+            paragraphs.append(" ".join(lines))
+    return image, "\n\n".join(paragraphs)
+
+
+def generate(count=60, seed=0, lines=4, words_per_line=6):
+    """Yields dicts with name, image, truth and the conditions used to render it."""
+    rng = random.Random(seed)
+    conditions = list(itertools.product(available_fonts(), SIZES, NOISE_LEVELS, SKEW_ANGLES, LIGHTING))
+    rng.shuffle(conditions)
+    for index in range(count):
+        font_name, size, noise, skew, lighting = conditions[index % len(conditions)]
+        text_lines = [" ".join(rng.choice(VOCABULARY) for _ in range(words_per_line)) for _ in range(lines)]
+        yield {
+            "name": f"sample_{index:04d}",
+            "image": render_sample(text_lines, font_name, size, noise, skew, lighting, rng),
+            "truth": "\n".join(text_lines),
+            "conditions": {
+                "font": font_name,
+                "size": size,
+                "noise": noise,
+                "skew": skew,
+                "lighting": lighting,
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the synthetic corpus to disk")
+    parser.add_argument("--count", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for sample in generate(args.count, args.seed):
+        sample["image"].save(os.path.join(args.out, sample["name"] + ".png"))
+        with open(os.path.join(args.out, sample["name"] + ".txt"), "w", encoding="utf-8") as truth:
+            truth.write(sample["truth"])
+
+
+if __name__ == "__main__":
+    main()
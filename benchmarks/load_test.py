@@ -0,0 +1,395 @@
+"""
+Load test: N concurrent virtual users driving the Streamlit app end to end
+(upload -> OCR -> submit) against fake Drive and Sheets backends.
+
+    python benchmarks/load_test.py --users 1 2 4 8 16 --duration 60
+    python benchmarks/load_test.py --users 1 2 4 --fake-ocr-ms 400   # without Tesseract
+    python benchmarks/load_test.py --output results/load.json
+
+Every virtual user is its own Streamlit session running the real app.py on
+its own script thread inside this one process, which is how a Streamlit
+server runs sessions, so GIL contention, the shared caches and per-session
+state behave as they do in production. Only the browser, the websocket and
+the Google services (fakes.FakeDrive / FakeWorksheet) are replaced; no
+credentials are read. Uploads are distinct synthetic A4 scans, so each flow
+pays for a real decode and OCR rather than a cache hit.
+
+For each user count the report gives completed flows/sec, per-step latency
+percentiles, session_state bytes per session and process RSS. The run ends
+with the saturation point: the user count after which adding users no
+longer raises throughput by --min-gain, and whether every submission
+reached the fake Drive and Sheets. A level where more than --max-error-rate
+of the flows failed fails the run (exit status 1); throughput measured
+past it says nothing about scaling.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from unittest.mock import MagicMock
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # `streamlit run` puts the script's directory on sys.path; AppTest doesn't
+
+from corpus import render_page  # noqa: E402
+from folder_index import FOLDER_MIME_TYPE  # noqa: E402
+from ocr_benchmark import percentiles  # noqa: E402
+
+UPLOAD_KEY = "load_test_upload"  # Session state key the patched st.file_uploader reads
+
+
+def scanned_page(seed):
+    """
+    corpus.render_page(seed) as a 300 DPI JPEG. Layouts vary with the seed
+    too, so pages also differ to the app's near-duplicate detector, not just
+    byte-wise.
+    """
+    image, _ = render_page(seed)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85, dpi=(300, 300))
+    return buffer.getvalue()
+
+
+class FakeUpload(io.BytesIO):
+    """What st.file_uploader returns: bytes plus a name and a per-upload file_id."""
+
+    def __init__(self, file_id, name, data):
+        super().__init__(data)
+        self.file_id = file_id
+        self.name = name
+        self.type = "image/jpeg"
+        self.size = len(data)
+
+
+class SleepEngine:
+    """Stands in for Tesseract: sleeps (releasing the GIL, as Tesseract does) instead of recognising."""
+
+    name = "sleep"
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def image_to_string(self, image, config=""):
+        time.sleep(self.seconds)
+        return "synthetic text"
+
+    def detect_script(self, image):
+        return "Latin", 10.0
+
+
+def install_fakes(workdir, fake_ocr_ms=None):
+    """
+    Points the app at fake Google backends, a throwaway spool and an
+    uploader that reads each session's upload from its session state.
+    Must run before the first session. Returns (drive, worksheet).
+    """
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    import google_clients
+    from fakes import FakeDrive, FakeSheetsClient, FakeWorksheet
+
+    os.environ["SUBMISSION_SPOOL_PATH"] = os.path.join(workdir, "submission_spool.sqlite3")
+    os.environ["SHEETS_SPOOL_PATH"] = os.path.join(workdir, "sheets_spool.jsonl")
+    for name in ("OCR_CACHE_PATH", "NEAR_DUPLICATE_INDEX_PATH", "DRIVE_FOLDER_INDEX_PATH", "OCR_SERVICE_URL"):
+        os.environ.pop(name, None)
+
+    drive = FakeDrive(latency=0.05)
+    worksheet = FakeWorksheet(latency=0.1)
+    google_clients.get_drive = lambda: drive
+    google_clients.authenticate_google_sheets = lambda: FakeSheetsClient(worksheet)
+
+    def file_uploader(label, type=None, accept_multiple_files=False, **kwargs):
+        upload = st.session_state.get(UPLOAD_KEY)
+        if upload is None:
+            return [] if accept_multiple_files else None
+        upload = FakeUpload(*upload)
+        return [upload] if accept_multiple_files else upload
+
+    st.file_uploader = file_uploader
+
+    if fake_ocr_ms is not None:
+        import ocr_engine
+        engine = SleepEngine(fake_ocr_ms / 1000)
+        ocr_engine.create_engine = lambda kind="auto", lang="eng": engine
+
+    # One mock Runtime for the whole process, as a server has one real Runtime.
+    # AppTest installs and removes a Runtime around every run, which breaks concurrent sessions.
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    return drive, worksheet
+
+
+def session_class():
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class Runner(LocalScriptRunner):
+        """Resets button triggers after a run like the real ScriptRunner, so Submit's st.rerun() does not click again."""
+
+        def _on_script_finished(self, ctx, event, premature_stop):
+            if not premature_stop:
+                self._session_state.on_script_finished(ctx.widget_ids_this_run)
+            super()._on_script_finished(ctx, event, premature_stop)
+
+    class Session(AppTest):
+        """An AppTest that leaves the process-wide Runtime alone, so many can run at once."""
+
+        def _run(self, widget_state=None, timeout=None):
+            runner = Runner(self._script_path, self.session_state)
+            self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout)
+            self._tree._runner = self
+            return self
+
+    return Session
+
+
+def state_bytes(value, seen=None):
+    """Bytes held by arrays, buffers and strings reachable from a session state value."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        base = value
+        while isinstance(base.base, np.ndarray):
+            base = base.base  # Views share their base's buffer; count it once
+        if base is not value:
+            return state_bytes(base, seen)
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(state_bytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sum(state_bytes(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return state_bytes(vars(value), seen)
+    return 0
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2 ** 20 if sys.platform == "darwin" else 1024)
+
+
+class PageSource:
+    """Hands out pre-rendered pages in order, counting reuse once they run out."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.reused = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            index = self._next
+            self._next += 1
+            if index >= len(self.pages):
+                self.reused += 1
+        return index, self.pages[index % len(self.pages)]
+
+
+def virtual_user(session_class, user, pages, deadline, think_time, timeout, flows):
+    """One user repeating upload -> OCR -> submit, each time in a fresh session, until the deadline."""
+    rng = random.Random(user)
+    while time.monotonic() < deadline:
+        index, data = pages.take()
+        session = session_class(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+        session.session_state[UPLOAD_KEY] = (f"load-{index}", f"page_{index:04d}.jpg", data)
+        flow = {"user": user, "error": None}
+        try:
+            started = time.perf_counter()
+            session.run()
+            flow["ocr"] = time.perf_counter() - started
+            if session.exception:
+                raise RuntimeError(session.exception[0].message)
+            state = session.session_state.filtered_state
+            flow["session_bytes"] = state_bytes({key: value for key, value in state.items() if key != UPLOAD_KEY})
+
+            time.sleep(think_time * rng.uniform(0.5, 1.5))  # Reading the text, typing the reference
+            # Entering the reference reruns the script (OCR is a cache hit now) and enables Submit
+            started = time.perf_counter()
+            next(widget for widget in session.text_input if widget.label == "Enter Reference Number").input(f"LT{index:05d}").run()
+            flow["rerun"] = time.perf_counter() - started
+            if session.exception:
+                raise RuntimeError(session.exception[0].message)
+
+            started = time.perf_counter()
+            next(widget for widget in session.button if widget.label == "Submit").click().run()
+            flow["submit"] = time.perf_counter() - started
+            if session.exception:
+                raise RuntimeError(session.exception[0].message)
+            flow["total"] = flow["ocr"] + flow["rerun"] + flow["submit"]
+        except Exception as e:
+            flow["error"] = f"{type(e).__name__}: {e}"
+        flow["finished"] = time.monotonic()
+        flows.append(flow)
+
+
+def run_level(session_class, users, pages, duration, think_time, timeout):
+    flows = []
+    rss_before = current_rss_mb()
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(session_class, user, pages, deadline, think_time, timeout, flows),
+                         name=f"virtual-user-{user}")
+        for user in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started  # Includes flows still running at the deadline
+
+    completed = [flow for flow in flows if not flow["error"]]
+    session_bytes = [flow["session_bytes"] for flow in completed]
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "flows": len(completed),
+        "errors": len(flows) - len(completed),
+        "first_error": next((flow["error"] for flow in flows if flow["error"]), None),
+        "flows_per_sec": round(len(completed) / elapsed, 3),
+        "latency": {step: percentiles([flow[step] for flow in completed]) for step in ("ocr", "rerun", "submit", "total")},
+        "session_state_mb": {
+            "mean": round(sum(session_bytes) / len(session_bytes) / 2 ** 20, 2) if session_bytes else None,
+            "max": round(max(session_bytes) / 2 ** 20, 2) if session_bytes else None,
+        },
+        "rss_mb": {"before": round(rss_before, 1), "after": round(current_rss_mb(), 1)},
+    }
+
+
+def level_failed(level, max_error_rate):
+    """True if the level finished no flow or more than `max_error_rate` of its flows failed."""
+    attempts = level["flows"] + level["errors"]
+    return not level["flows"] or level["errors"] > attempts * max_error_rate
+
+
+def saturation_point(levels, min_gain):
+    """
+    The user count after which throughput grew by less than `min_gain` (e.g.
+    0.1 = 10%), or None. Levels should stop before the first failed one.
+    """
+    for previous, level in zip(levels, levels[1:]):
+        if level["flows_per_sec"] < previous["flows_per_sec"] * (1 + min_gain):
+            return previous["users"]
+    return None
+
+
+def wait_for_delivery(timeout):
+    """
+    Waits for the spool to drain; returns {(kind, status): count}. Reads
+    through a read-only connection, so it can't touch deliveries the app's
+    dispatcher is still working on.
+    """
+    path = os.path.abspath(os.environ["SUBMISSION_SPOOL_PATH"])
+    db = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            rows = db.execute("SELECT kind, status, COUNT(*) FROM deliveries GROUP BY kind, status").fetchall()
+            counts = {(kind, status): count for kind, status, count in rows}
+            if not any(status in ("pending", "running") for _, status in counts) or time.monotonic() > deadline:
+                return counts
+            time.sleep(0.5)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrent users per level")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between OCR and submit")
+    parser.add_argument("--pages", type=int, default=64, help="distinct pages to pre-render")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a script run counts as failed")
+    parser.add_argument("--fake-ocr-ms", type=float, help="replace Tesseract with a sleep of this length")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="throughput gain that still counts as scaling")
+    parser.add_argument("--max-error-rate", type=float, default=0.5, help="share of failed flows that fails a level")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ocr-load-")  # Spool and its deliveries; removed at the end
+    try:
+        drive, worksheet = install_fakes(workdir, args.fake_ocr_ms)
+        print(f"Rendering {args.pages} pages...")
+        pages = PageSource([scanned_page(seed) for seed in range(args.pages)])
+        session = session_class()
+
+        levels = []
+        for users in sorted(args.users):
+            level = run_level(session, users, pages, args.duration, args.think_time, args.timeout)
+            levels.append(level)
+            total = level["latency"]["total"]
+            print(
+                f"{users:>3} users: {level['flows_per_sec']:6.2f} flows/s  "
+                f"total p50 {total.get('p50_ms', 0):8.0f} ms  p90 {total.get('p90_ms', 0):8.0f} ms  "
+                f"p99 {total.get('p99_ms', 0):8.0f} ms  session {level['session_state_mb']['mean']} MB  "
+                f"RSS {level['rss_mb']['after']:.0f} MB  errors {level['errors']}"
+            )
+            if level["first_error"]:
+                print(f"      e.g. {level['first_error']}")
+
+        failed = next((level for level in levels if level_failed(level, args.max_error_rate)), None)
+        saturation = saturation_point(levels[:levels.index(failed)] if failed else levels, args.min_gain)
+        delivery = wait_for_delivery(timeout=60)
+        submitted = sum(level["flows"] for level in levels)
+        report = {
+            "levels": levels,
+            "saturation_users": saturation,
+            "failed_users": failed["users"] if failed else None,
+            "fake_ocr_ms": args.fake_ocr_ms,
+            "pages_reused": pages.reused,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 1024), 1),
+            "delivery": {f"{kind}_{status}": count for (kind, status), count in sorted(delivery.items())},
+            "sheet_rows": len(worksheet.rows),
+            "drive_files": sum(1 for metadata, _ in drive.files.values() if metadata.get("mimeType") != FOLDER_MIME_TYPE),
+        }
+
+        if failed:
+            print(f"FAILED at {failed['users']} users: {failed['errors']} of {failed['flows'] + failed['errors']} flows failed")
+            if saturation is not None:
+                print(f"Saturation before that: throughput stops scaling beyond {saturation} users")
+        elif saturation is None:
+            print("No saturation: throughput still scaled at the highest user count")
+        else:
+            print(f"Saturation: throughput stops scaling beyond {saturation} users")
+        print(f"Submitted {submitted} flows; {report['sheet_rows']} sheet rows and {report['drive_files']} Drive files delivered")
+        if pages.reused:
+            print(f"Note: {pages.reused} flows reused a page (raise --pages); those were cache hits")
+
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as out:
+                json.dump(report, out, indent=2)
+        if failed:
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
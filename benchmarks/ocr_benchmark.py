@@ -0,0 +1,213 @@
+"""
+End-to-end OCR benchmark and accuracy regression check on the synthetic corpus.
+
+    python benchmarks/ocr_benchmark.py --preset classic --output results/classic.json
+    python benchmarks/ocr_benchmark.py --output new.json --baseline results/classic.json
+
+Each sample goes through the app's own decode_array -> preprocess_array ->
+extract_text_tesseract path. The report covers per-stage latency percentiles,
+images/sec, peak RSS and CER/WER (overall and per corpus condition). It is
+written as JSON so two runs can be diffed; --baseline prints the deltas.
+Runs fully offline: no Drive or Sheets credentials are touched.
+
+The run exits with status 1 if any sample failed OCR or, with --baseline,
+if CER rose by more than --max-cer-increase or throughput fell by more than
+--max-slowdown. Samples are generated one at a time, so peak RSS reflects
+the pipeline rather than the corpus.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accuracy import char_error_rate, word_error_rate  # noqa: E402
+from corpus import generate  # noqa: E402
+from ocr_pipeline import decode_array, extract_text_tesseract, preprocess_array, starts_grayscale  # noqa: E402
+from preprocessing import PRESETS  # noqa: E402
+
+
+def percentiles(values):
+    """p50/p90/p99/max in milliseconds (nearest-rank)."""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(fraction):
+        return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+    return {
+        "p50_ms": round(rank(0.50), 3),
+        "p90_ms": round(rank(0.90), 3),
+        "p99_ms": round(rank(0.99), 3),
+        "max_ms": round(values[-1] * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_sample(sample, stages):
+    buffer = io.BytesIO()
+    sample["image"].save(buffer, format="PNG")
+    data = buffer.getvalue()
+
+    timings = {}
+    started = time.perf_counter()
+    array, _, dpi = decode_array(data, grayscale=starts_grayscale(stages))
+    timings["decode"] = time.perf_counter() - started
+
+    preprocessed = preprocess_array(array, stages, timings, source_dpi=dpi)
+
+    started = time.perf_counter()
+    text, error = "", None
+    try:
+        text = extract_text_tesseract(preprocessed)
+    except Exception as e:
+        error = str(e)
+    timings["tesseract"] = time.perf_counter() - started
+    return text, error, timings
+
+
+def summarise_accuracy(rows):
+    if not rows:
+        return {"samples": 0}
+    return {
+        "samples": len(rows),
+        "cer": round(sum(row["cer"] for row in rows) / len(rows), 4),
+        "wer": round(sum(row["wer"] for row in rows) / len(rows), 4),
+    }
+
+
+def run_benchmark(preset, count, seed, warmup=2):
+    stages = PRESETS[preset]
+    samples = generate(count + warmup, seed)  # Lazily, so only the sample being OCR'd is in memory
+    for sample in itertools.islice(samples, warmup):
+        run_sample(sample, stages)  # Warm-up, excluded from the numbers
+
+    stage_times = defaultdict(list)
+    rows = []
+    errors = []
+    started = time.perf_counter()
+    for sample in samples:
+        sample_started = time.perf_counter()
+        text, error, timings = run_sample(sample, stages)
+        stage_times["total"].append(time.perf_counter() - sample_started)
+        for name, seconds in timings.items():
+            stage_times[name].append(seconds)
+        if error:
+            errors.append({"name": sample["name"], "error": error})
+            continue
+        rows.append({
+            "name": sample["name"],
+            "conditions": sample["conditions"],
+            "cer": char_error_rate(sample["truth"], text),
+            "wer": word_error_rate(sample["truth"], text),
+        })
+    elapsed = time.perf_counter() - started
+
+    by_condition = {}
+    for key in ("font", "size", "noise", "skew", "lighting"):
+        groups = defaultdict(list)
+        for row in rows:
+            groups[str(row["conditions"][key])].append(row)
+        by_condition[key] = {value: summarise_accuracy(group) for value, group in sorted(groups.items())}
+
+    return {
+        "preset": preset,
+        "seed": seed,
+        "images": count,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "images_per_sec": round(count / elapsed, 3) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "latency": {name: percentiles(values) for name, values in stage_times.items()},
+        "accuracy": summarise_accuracy(rows),
+        "accuracy_by_condition": by_condition,
+        "errors": errors,
+        "samples": rows,
+    }
+
+
+def compare(result, baseline, max_cer_increase, max_slowdown):
+    """
+    Prints speed and accuracy deltas against a previous run and returns the
+    regressions beyond the thresholds, as messages: CER up by more than
+    `max_cer_increase` (absolute), images/sec down by more than
+    `max_slowdown` (a fraction, e.g. 0.2 = 20%).
+    """
+    def delta(label, new, old, unit="", lower_is_better=True):
+        if new is None or old is None:
+            return
+        change = new - old
+        worse = change > 0 if lower_is_better else change < 0
+        print(f"  {label:<28} {old:>10.3f} -> {new:>10.3f}{unit}  ({change:+.3f}{' WORSE' if worse and change else ''})")
+
+    print(f"vs baseline (preset {baseline.get('preset')}, {baseline.get('images')} images):")
+    delta("images/sec", result["images_per_sec"], baseline.get("images_per_sec"), lower_is_better=False)
+    delta("peak RSS", result["peak_rss_mb"], baseline.get("peak_rss_mb"), " MB")
+    delta("CER", result["accuracy"].get("cer"), baseline.get("accuracy", {}).get("cer"))
+    delta("WER", result["accuracy"].get("wer"), baseline.get("accuracy", {}).get("wer"))
+    for name, stats in result["latency"].items():
+        old = baseline.get("latency", {}).get(name, {})
+        delta(f"{name} p50", stats.get("p50_ms"), old.get("p50_ms"), " ms")
+        delta(f"{name} p99", stats.get("p99_ms"), old.get("p99_ms"), " ms")
+
+    regressions = []
+    cer, old_cer = result["accuracy"].get("cer"), baseline.get("accuracy", {}).get("cer")
+    if cer is not None and old_cer is not None and cer - old_cer > max_cer_increase:
+        regressions.append(f"CER rose by {cer - old_cer:.4f} (allowed {max_cer_increase})")
+    speed, old_speed = result["images_per_sec"], baseline.get("images_per_sec")
+    if speed and old_speed and speed < old_speed * (1 - max_slowdown):
+        regressions.append(f"images/sec fell by {1 - speed / old_speed:.0%} (allowed {max_slowdown:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", default="classic", choices=sorted(PRESETS))
+    parser.add_argument("--count", type=int, default=60, help="corpus size")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed; keep fixed when comparing runs")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--max-cer-increase", type=float, default=0.005, help="allowed CER rise over the baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.2, help="allowed images/sec drop, as a fraction")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.preset, args.count, args.seed)
+
+    print(f"{result['images']} images  {result['images_per_sec']:.2f} images/sec  peak RSS {result['peak_rss_mb']} MB")
+    for name, stats in result["latency"].items():
+        print(f"  {name:<18} p50 {stats['p50_ms']:>9.2f} ms  p90 {stats['p90_ms']:>9.2f} ms  p99 {stats['p99_ms']:>9.2f} ms")
+    if result["accuracy"]["samples"]:
+        print(f"CER {result['accuracy']['cer']:.4f}  WER {result['accuracy']['wer']:.4f}")
+    if result["errors"]:
+        print(f"{len(result['errors'])} samples failed OCR, e.g.: {result['errors'][0]['error']}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(result, out, indent=2)
+    failures = [f"{len(result['errors'])} samples failed OCR"] if result["errors"] else []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            failures += compare(result, json.load(baseline), args.max_cer_increase, args.max_slowdown)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import io
+import os
+
+from PIL import Image, ImageSequence
+
+PDF_EXTENSIONS = (".pdf",)
+TIFF_EXTENSIONS = (".tif", ".tiff")
+PDF_RENDER_DPI = 300  # Tesseract's preferred input resolution for scanned pages
+
+
+def is_multipage_document(filename):
+    return filename.lower().endswith(PDF_EXTENSIONS + TIFF_EXTENSIONS)
+
+
+def document_page_count(data, filename):
+    """Number of pages, read from the document structure without rendering any of them."""
+    extension = os.path.splitext(filename.lower())[1]
+    if extension in PDF_EXTENSIONS:
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(data)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if extension in TIFF_EXTENSIONS:
+        with Image.open(io.BytesIO(data)) as tiff:
+            return getattr(tiff, "n_frames", 1)  # Walks the frame directory; no pixels are decoded
+    return 1
+
+
+def iter_document_pages(data, filename, pages=None):
+    """
+    Yields (page_number, RGB PIL image) one page at a time. Only the current
+    page is decoded, so memory stays bounded regardless of the page count.
+    `pages` restricts decoding to those 1-based page numbers.
+    """
+    extension = os.path.splitext(filename.lower())[1]
+    if extension in PDF_EXTENSIONS:
+        yield from _iter_pdf_pages(data, pages)
+    elif extension in TIFF_EXTENSIONS:
+        yield from _iter_tiff_pages(data, pages)
+    elif pages is None or 1 in pages:
+        yield 1, Image.open(io.BytesIO(data)).convert("RGB")
+
+
+def _iter_pdf_pages(data, pages=None):
+    import pypdfium2 as pdfium  # Only needed when a PDF is uploaded
+
+    pdf = pdfium.PdfDocument(data)
+    try:
+        for index in range(len(pdf)):
+            if pages is not None and index + 1 not in pages:
+                continue
+            page = pdf[index]
+            bitmap = page.render(scale=PDF_RENDER_DPI / 72)
+            try:
+                yield index + 1, bitmap.to_pil().convert("RGB")
+            finally:
+                # Release the native page and bitmap before rendering the next one
+                bitmap.close()
+                page.close()
+    finally:
+        pdf.close()
+
+
+def _iter_tiff_pages(data, pages=None):
+    with Image.open(io.BytesIO(data)) as tiff:
+        for index, frame in enumerate(ImageSequence.Iterator(tiff)):
+            # ImageSequence seeks in place, so only the current frame is decoded
+            if pages is None or index + 1 in pages:
+                yield index + 1, frame.convert("RGB")
@@ -0,0 +1,174 @@
+import io
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+from folder_index import FolderIndex
+
+IDEMPOTENCY_PROPERTY = "ocr_submission"  # Private Drive file property holding "<submission key>-<file index>"
+MAX_JOBS_KEPT = 1000  # Recent jobs kept for status lookups; the queue lives as long as the server
+
+
+class UploadJob:
+    """Status of one submission's Drive upload, readable from the UI."""
+
+    def __init__(self, job_id, ref_number, files):
+        self.job_id = job_id
+        self.ref_number = ref_number
+        self.titles = [title for title, _, _ in files]
+        self.status = "queued"  # queued -> uploading -> done | failed
+        self.error = None
+        self.attempts = 0
+        self.created = time.time()
+        self.finished = None
+
+
+class DriveUploadQueue:
+    """
+    Background Drive uploader. Submit returns immediately; the files of a job
+    are uploaded in parallel straight from memory (no temp files, no sleeps)
+    with bounded concurrency and exponential backoff on failure.
+
+    `drive` is a pydrive2 GoogleDrive (or fakes.FakeDrive for local testing),
+    or a zero-argument callable returning one, so authentication can wait
+    until the first upload.
+    Folder ids come from a FolderIndex, so repeat references cost no lookup.
+    """
+
+    def __init__(self, drive, parent_folder_id, max_workers=4, max_retries=4, backoff=0.5, folder_index=None):
+        self.get_drive = drive if callable(drive) else (lambda: drive)
+        self.parent_folder_id = parent_folder_id
+        self.folder_index = folder_index or FolderIndex(drive)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._job_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-job")
+        self._file_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-file")
+
+    def submit(self, ref_number, files, on_done=None, on_failed=None, idempotency_key=None, resume=False):
+        """
+        Queues [(title, bytes, mime_type), ...] for upload and returns the job id.
+        `on_done(job)` / `on_failed(job)` are called from the upload thread once
+        every file is uploaded / once the job has run out of retries.
+
+        With an `idempotency_key`, each file is tagged with a private property
+        and, before any retry (or the first try when `resume` says an earlier
+        run may have uploaded some files), Drive is asked whether it already
+        has the file, so a lost response never produces a duplicate.
+        """
+        with self._lock:
+            job = UploadJob(next(self._ids), ref_number, files)
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > MAX_JOBS_KEPT:
+                self._jobs.popitem(last=False)  # A running job keeps its own reference
+            self._pending += 1
+            metrics.set_gauge("drive_jobs_pending", self._pending)
+        metrics.inc("drive_submits_total")
+        self._job_pool.submit(self._run, job, files, on_done, on_failed, idempotency_key, resume)
+        return job.job_id
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._job_pool.shutdown(wait=wait)
+        self._file_pool.shutdown(wait=wait)
+
+    def _run(self, job, files, on_done=None, on_failed=None, idempotency_key=None, resume=False):
+        job.status = "uploading"
+        try:
+            folder_id = self._retry(job, self.folder_index.get_or_create, self.parent_folder_id, job.ref_number)
+            futures = []
+            for index, (title, data, mime_type) in enumerate(files):
+                file_key = f"{idempotency_key}-{index}" if idempotency_key else None
+                lookup = (lambda file_key=file_key: self._find_by_key(folder_id, file_key)) if file_key else None
+                futures.append(self._file_pool.submit(
+                    self._retry, job, self._upload_file, folder_id, title, data, mime_type, file_key,
+                    lookup=lookup, resume=resume,
+                ))
+            wait(futures)
+            for future in futures:
+                future.result()  # Re-raise the first upload that ran out of retries
+            job.status = "done"
+        except Exception as e:
+            # The cached folder may be stale (trashed or deleted); look it up afresh next time
+            self.folder_index.invalidate(self.parent_folder_id, job.ref_number)
+            job.status = "failed"
+            job.error = str(e)
+            metrics.inc("drive_jobs_failed_total")
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+                metrics.set_gauge("drive_jobs_pending", self._pending)
+        if on_done is not None and job.status == "done":
+            on_done(job)
+        elif on_failed is not None and job.status == "failed":
+            on_failed(job)
+
+    def _retry(self, job, func, *args, lookup=None, resume=False):
+        """
+        Calls func with retries. `lookup()` returns the result of an earlier
+        attempt that landed despite failing (or None); it is consulted before
+        every retry, and before the first attempt when `resume` is set.
+        """
+        for attempt in range(self.max_retries + 1):
+            job.attempts += 1
+            try:
+                if lookup is not None and (attempt or resume):
+                    found = lookup()
+                    if found is not None:
+                        metrics.inc("drive_duplicates_skipped_total")
+                        return found
+                return func(*args)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter so parallel retries don't align
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def _http(self):
+        """One authorised HTTP object per thread; httplib2 is not thread-safe."""
+        get_http = getattr(getattr(self.get_drive(), "auth", None), "Get_Http_Object", None)
+        if get_http is None:
+            return None
+        if not hasattr(self._local, "http"):
+            self._local.http = get_http()
+        return self._local.http
+
+    def _find_by_key(self, folder_id, file_key):
+        """Id of the file in the folder tagged with this idempotency key, or None."""
+        query = (
+            f"properties has {{ key='{IDEMPOTENCY_PROPERTY}' and value='{file_key}' and visibility='PRIVATE' }} "
+            f"and '{folder_id}' in parents and trashed=false"
+        )
+        metrics.inc("drive_api_calls_total", op="list")
+        matches = self.get_drive().ListFile({'q': query}).GetList()
+        return matches[0]['id'] if matches else None
+
+    def _upload_file(self, folder_id, title, data, mime_type, file_key=None):
+        metadata = {'title': title, 'mimeType': mime_type, 'parents': [{'id': folder_id}]}
+        if file_key:
+            metadata['properties'] = [{'key': IDEMPOTENCY_PROPERTY, 'value': file_key, 'visibility': 'PRIVATE'}]
+        drive_file = self.get_drive().CreateFile(metadata)
+        # pydrive2 has no bytes setter; this mirrors what SetContentString does internally
+        drive_file.content = io.BytesIO(data)
+        drive_file.dirty['content'] = True
+        http = self._http()
+        metrics.inc("drive_api_calls_total", op="upload")
+        with metrics.span("drive_upload"):
+            drive_file.Upload(param={"http": http} if http is not None else None)
+        return drive_file['id']
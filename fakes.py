@@ -0,0 +1,161 @@
+"""
+Local stand-ins for the Google services, for tests, benchmarks and offline
+development. They keep everything in memory and can inject latency and
+failures to exercise retries. `lost_response_rate` fails a call after the
+write has landed, as a timeout would, to exercise idempotency checks.
+"""
+import io
+import itertools
+import random
+import threading
+import time
+
+
+class FakeDriveError(Exception):
+    """Raised by the fakes when a failure is injected."""
+
+
+class FakeDriveFile(dict):
+    def __init__(self, drive, metadata):
+        super().__init__(metadata)
+        self._drive = drive
+        self.content = None
+        self.dirty = {'content': False}
+
+    def SetContentString(self, content, encoding="utf-8"):
+        self.content = io.BytesIO(content.encode(encoding))
+        self.dirty['content'] = True
+
+    def Upload(self, param=None):
+        self._drive._call()
+        data = self.content.getvalue() if self.content is not None else b""
+        self._drive._store(self, data)
+        self._drive._lose_response()
+
+
+class FakeFileList:
+    def __init__(self, drive, param):
+        self._drive = drive
+        self._param = param
+
+    def GetList(self):
+        self._drive._call()
+        return self._drive._query(self._param.get('q', ''))
+
+
+class FakeDrive:
+    """Minimal pydrive2 GoogleDrive look-alike: CreateFile, ListFile, Upload."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None, lost_response_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.lost_response_rate = lost_response_rate
+        self.files = {}  # id -> (metadata dict, bytes)
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def CreateFile(self, metadata=None):
+        return FakeDriveFile(self, dict(metadata or {}))
+
+    def ListFile(self, param=None):
+        return FakeFileList(self, dict(param or {}))
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeDriveError("injected Drive failure")
+
+    def _lose_response(self):
+        with self._lock:
+            lost = self._random.random() < self.lost_response_rate
+        if lost:
+            raise FakeDriveError("injected lost Drive response")
+
+    def _store(self, drive_file, data):
+        with self._lock:
+            if 'id' not in drive_file:
+                drive_file['id'] = f"fake-{next(self._ids)}"
+            self.files[drive_file['id']] = (
+                {key: value for key, value in drive_file.items()},
+                data,
+            )
+
+    def _query(self, query):
+        """Understands the title / parent / mimeType / properties clauses our code sends."""
+        prop = None
+        if "properties has {" in query:
+            prop_clause, query = query.split("properties has {", 1)[1].split("}", 1)
+            prop = tuple(prop_clause.split(f"{name}='", 1)[1].split("'", 1)[0] for name in ("key", "value"))
+        clauses = dict(
+            (name, query.split(f"{name}='", 1)[1].split("'", 1)[0])
+            for name in ("title", "mimeType")
+            if f"{name}='" in query
+        )
+        parent = query.split(" in parents", 1)[0].rsplit("'", 2)[-2] if " in parents" in query else None
+        with self._lock:
+            matches = []
+            for metadata, _ in self.files.values():
+                if any(metadata.get(name) != value for name, value in clauses.items()):
+                    continue
+                if parent and parent not in [p['id'] for p in metadata.get('parents', [])]:
+                    continue
+                if prop and prop not in [(p['key'], p['value']) for p in metadata.get('properties', [])]:
+                    continue
+                matches.append(dict(metadata))
+            return matches
+
+    def titles(self):
+        with self._lock:
+            return sorted(metadata['title'] for metadata, _ in self.files.values())
+
+
+class FakeWorksheet:
+    """Records rows passed to append_row / append_rows, like a gspread Worksheet."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None, lost_response_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.lost_response_rate = lost_response_rate
+        self.rows = []
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def append_row(self, row, **kwargs):
+        self.append_rows([row])
+
+    def append_rows(self, rows, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeDriveError("injected Sheets failure")
+        with self._lock:
+            self.rows.extend(list(row) for row in rows)
+            lost = self._random.random() < self.lost_response_rate
+        if lost:
+            raise FakeDriveError("injected lost Sheets response")
+
+    def col_values(self, col):
+        """Values of one 1-based column, like gspread (short rows read as empty)."""
+        with self._lock:
+            self.calls += 1
+            return [str(row[col - 1]) if len(row) >= col else "" for row in self.rows]
+
+
+class FakeSheetsClient:
+    """gspread client look-alike whose open(title).sheet1 is the given FakeWorksheet."""
+
+    def __init__(self, worksheet=None):
+        self.worksheet = worksheet or FakeWorksheet()
+
+    def open(self, title):
+        return type("FakeSpreadsheet", (), {"title": title, "sheet1": self.worksheet})()
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+
+class FolderIndex:
+    """
+    Maps (parent_folder_id, ref_number) to a Drive folder id so repeat submits
+    skip the ListFile round-trip. Entries live in memory for `ttl` seconds and
+    are optionally mirrored to SQLite so the index survives restarts.
+
+    Concurrent lookups of the same key are single-flighted: one thread queries
+    or creates the folder and the others wait for its result, so two users
+    submitting the same reference at once share one create call.
+    """
+
+    def __init__(self, drive, ttl=3600, sqlite_path=None):
+        self.get_drive = drive if callable(drive) else (lambda: drive)  # Drive or a factory for one
+        self.ttl = ttl
+        self._entries = {}  # key -> (folder_id, expires_at)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS drive_folders ("
+                "parent_id TEXT NOT NULL, ref_number TEXT NOT NULL, folder_id TEXT NOT NULL, "
+                "expires_at REAL, PRIMARY KEY (parent_id, ref_number))"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(drive_folders)")]
+            if "expires_at" not in columns:  # Rows from before expiry was stored count as expired
+                self._db.execute("ALTER TABLE drive_folders ADD COLUMN expires_at REAL")
+            self._db.commit()
+
+    def get_or_create(self, parent_folder_id, ref_number):
+        with metrics.span("drive_folder_lookup"):
+            return self._get_or_create(parent_folder_id, ref_number)
+
+    def _get_or_create(self, parent_folder_id, ref_number):
+        key = (parent_folder_id, ref_number)
+        with self._lock:
+            folder_id = self._lookup_local(key)
+            if folder_id is not None:
+                metrics.inc("drive_folder_cache_total", result="hit")
+                return folder_id
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+
+        if not leader:
+            metrics.inc("drive_folder_cache_total", result="shared")
+            return flight.result()
+
+        metrics.inc("drive_folder_cache_total", result="miss")
+        try:
+            folder_id = self._find_or_create_remote(parent_folder_id, ref_number)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        with self._lock:
+            self._remember(key, folder_id)
+        flight.set_result(folder_id)
+        return folder_id
+
+    def invalidate(self, parent_folder_id, ref_number):
+        """Drops a folder id that Drive rejected (e.g. the folder was trashed)."""
+        key = (parent_folder_id, ref_number)
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute(
+                    "DELETE FROM drive_folders WHERE parent_id = ? AND ref_number = ?", key
+                )
+                self._db.commit()
+
+    def _lookup_local(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        if self._db is not None:
+            # The mirror keeps the original expiry (wall clock, as it outlives the process), so reading
+            # an entry back doesn't restart its TTL
+            row = self._db.execute(
+                "SELECT folder_id, expires_at FROM drive_folders "
+                "WHERE parent_id = ? AND ref_number = ? AND expires_at > ?", (*key, time.time())
+            ).fetchone()
+            if row is not None:
+                self._entries[key] = (row[0], time.monotonic() + row[1] - time.time())
+                return row[0]
+        return None
+
+    def _remember(self, key, folder_id):
+        self._entries[key] = (folder_id, time.monotonic() + self.ttl)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO drive_folders (parent_id, ref_number, folder_id, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (*key, folder_id, time.time() + self.ttl),
+            )
+            self._db.commit()
+
+    def _find_or_create_remote(self, parent_folder_id, ref_number):
+        folder_query = (
+            f"title='{ref_number}' and '{parent_folder_id}' in parents "
+            f"and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        )
+        metrics.inc("drive_api_calls_total", op="list")
+        drive = self.get_drive()
+        folder_list = drive.ListFile({'q': folder_query}).GetList()
+        if folder_list:
+            return folder_list[0]['id']
+
+        folder = drive.CreateFile({
+            'title': ref_number,
+            'mimeType': FOLDER_MIME_TYPE,
+            'parents': [{'id': parent_folder_id}]
+        })
+        metrics.inc("drive_api_calls_total", op="create_folder")
+        folder.Upload()
+        return folder['id']
@@ -0,0 +1,60 @@
+"""
+Lazily created, process-wide Google Drive and Sheets clients.
+
+Nothing here runs at import time: the Google libraries are imported and the
+credentials read on first use (i.e. the first Submit), then the clients are
+reused. Token refresh is serialised so concurrent uploads never refresh twice.
+"""
+import threading
+
+DRIVE_CREDENTIALS_FILE = "mycreds.txt"
+SHEETS_CREDENTIALS_FILE = "credentials.json"
+SHEETS_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+_lock = threading.Lock()
+_gauth = None
+_drive = None
+_sheets_client = None
+
+
+def _refresh_if_expired():
+    """Caller holds _lock."""
+    if _gauth.access_token_expired:
+        _gauth.Refresh()
+        _gauth.SaveCredentialsFile(DRIVE_CREDENTIALS_FILE)
+
+
+def get_drive():
+    """Returns the shared GoogleDrive, authenticating on first call and refreshing expired tokens."""
+    global _gauth, _drive
+    with _lock:
+        if _drive is None:
+            from pydrive2.auth import GoogleAuth
+            from pydrive2.drive import GoogleDrive
+
+            gauth = GoogleAuth()
+            gauth.LoadCredentialsFile(DRIVE_CREDENTIALS_FILE)  # Load saved credentials
+            if gauth.credentials is None:
+                gauth.LocalWebserverAuth()  # Authenticate manually
+            elif gauth.access_token_expired:
+                gauth.Refresh()
+            else:
+                gauth.Authorize()  # Use existing credentials
+            gauth.SaveCredentialsFile(DRIVE_CREDENTIALS_FILE)  # Save credentials
+            _gauth, _drive = gauth, GoogleDrive(gauth)
+        else:
+            _refresh_if_expired()
+        return _drive
+
+
+def authenticate_google_sheets():
+    """Returns the shared gspread client, authorising it once per process."""
+    global _sheets_client
+    with _lock:
+        if _sheets_client is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            creds = ServiceAccountCredentials.from_json_keyfile_name(SHEETS_CREDENTIALS_FILE, SHEETS_SCOPE)
+            _sheets_client = gspread.authorize(creds)
+        return _sheets_client
@@ -0,0 +1,79 @@
+"""
+Script detection: picks the smallest Tesseract language set for a page or
+region, so a Sinhala letter is read with `sin`, an English one with `eng`,
+and only a genuinely mixed page pays for both models.
+
+Tesseract's OSD pass (the `osd` model) reports one dominant script per image.
+On large pages the biggest text blocks are sampled separately, so a page
+with a Tamil body and an English letterhead detects both scripts.
+"""
+import logging
+import os
+
+import numpy as np
+import pytesseract
+
+import metrics
+from layout import detect_text_blocks
+from ocr_engine import ScriptDetectionUnavailable, get_engine
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"
+SCRIPT_LANGUAGES = {"Latin": "eng", "Sinhala": "sin", "Tamil": "tam"}
+LANGUAGE_ORDER = ("sin", "tam", "eng")  # Tesseract tries the first language first
+MIN_SCRIPT_CONFIDENCE = 1.0  # OSD script_conf; below this the guess is noise
+MAX_SAMPLE_BLOCKS = 3
+MIN_SAMPLE_PIXELS = 2_000_000  # Smaller pages are detected in one OSD call
+
+_unavailable = None  # Why OSD can't run in this process, once a call has found out
+
+
+def _samples(array):
+    """The whole page, or its largest text blocks (largest first) on big pages."""
+    if array.size < MIN_SAMPLE_PIXELS:
+        return [array]
+    blocks = sorted(detect_text_blocks(array), key=lambda box: box[2] * box[3], reverse=True)
+    if len(blocks) < 2:
+        return [array]
+    return [array[y:y + h, x:x + w] for x, y, w, h in blocks[:MAX_SAMPLE_BLOCKS]]
+
+
+def detect_languages(image, default=None):
+    """
+    Returns a "+"-joined language set such as "sin+eng" for a preprocessed
+    page or region (PIL image or array). Falls back to `default` (OCR_LANG,
+    else "eng") when OSD fails (too little text) or finds no script we have
+    a model for. When OSD can't run at all (no tesseract binary or osd
+    model), that is logged once and later calls return `default` at once.
+    """
+    global _unavailable
+    default = default or os.environ.get("OCR_LANG", "eng")
+    if _unavailable is not None:
+        metrics.inc("script_detect_total", lang=default)
+        return default
+    array = np.asarray(image)
+    languages = set()
+    with metrics.span("script_detect"):
+        for sample in _samples(array):
+            try:
+                script, confidence = get_engine(default).detect_script(sample)
+            except (pytesseract.TesseractError, RuntimeError):
+                continue  # Too few characters to decide
+            except ScriptDetectionUnavailable as e:
+                _unavailable = str(e)
+                logger.error("Script auto-detection is unavailable, using %s: %s", default, e)
+                metrics.inc("script_detect_unavailable_total")
+                break
+            if confidence >= MIN_SCRIPT_CONFIDENCE and script in SCRIPT_LANGUAGES:
+                languages.add(SCRIPT_LANGUAGES[script])
+    lang = "+".join(code for code in LANGUAGE_ORDER if code in languages) or default
+    metrics.inc("script_detect_total", lang=lang)
+    return lang
+
+
+def resolve_language(image, lang=None):
+    """Resolves lang="auto" to a detected language set; other values pass through."""
+    if lang == AUTO:
+        return detect_languages(image)
+    return lang
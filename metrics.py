@@ -0,0 +1,167 @@
+"""
+Process-wide metrics: counters, gauges and latency histograms. Labels are
+passed as keyword arguments:
+
+    metrics.inc("drive_api_calls_total", op="list")
+    with metrics.span("decode"):
+        ...
+
+`render_prometheus()` produces the text exposition format; ocr_service.py
+serves it on /metrics and the Streamlit app on METRICS_PORT.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; wide enough for a 5 ms stage and a 30 s Drive retry
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = {}  # key -> [bucket counts..., +Inf count, sum]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Records one value (normally seconds) in a histogram."""
+    with _lock:
+        histogram = _histograms.get(_key(name, labels))
+        if histogram is None:
+            histogram = _histograms[_key(name, labels)] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect_left(BUCKETS, value)] += 1
+        histogram[-1] += value
+
+
+@contextmanager
+def span(stage, **labels):
+    """Times a block into stage_seconds{stage=...}; exceptions also count in stage_errors_total."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("stage_errors_total", stage=stage, **labels)
+        raise
+    finally:
+        observe("stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+
+def get(name, **labels):
+    with _lock:
+        key = _key(name, labels)
+        return _gauges[key] if key in _gauges else _counters.get(key, 0)
+
+
+def total(name):
+    """Sum of a counter across all label values."""
+    with _lock:
+        return sum(value for (counter, _), value in _counters.items() if counter == name)
+
+
+def snapshot():
+    with _lock:
+        values = dict(_counters)
+        values.update(_gauges)
+        return values
+
+
+def drain():
+    """
+    Returns and resets this process's counters and histograms. Pool workers
+    call it so the parent can merge() what they recorded.
+    """
+    global _counters, _histograms
+    with _lock:
+        state = {"counters": dict(_counters), "histograms": _histograms}
+        _counters, _histograms = defaultdict(float), {}
+        return state
+
+
+def merge(state):
+    with _lock:
+        for key, value in state["counters"].items():
+            _counters[key] += value
+        for key, values in state["histograms"].items():
+            histogram = _histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                histogram[index] += value
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        declare(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), value in gauges:
+        declare(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), values in histograms:
+        declare(name, "histogram")
+        cumulative = 0
+        bounds = [f"{bound:g}" for bound in BUCKETS] + ["+Inf"]
+        for bound, count in zip(bounds, values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serves /metrics from a daemon thread, for processes without their own web server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
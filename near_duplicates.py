@@ -0,0 +1,302 @@
+"""
+Near-duplicate detection for uploads: re-saved scans, re-compressed photos
+and resized copies hash alike even though their bytes differ.
+
+Each image gets two perceptual hashes from a small grayscale thumbnail and
+a content signature:
+
+- a 64-bit pHash (DCT), scanned for candidates within a small Hamming radius;
+- a 1024-bit dHash (32x32 gradient signs), which narrows the candidates;
+- a binarised ink mask at 1536 px on the long side, which confirms one.
+
+No thumbnail hash can tell two invoices of one template apart when only the
+invoice number or an amount differs: those pages hash identically at 1024
+bits. The ink masks are compared tile by tile, allowing each stroke to move by
+a pixel, and a single tile with a few unexplained ink pixels (one changed
+digit) rejects the match. Re-saved, re-compressed and resized copies leave
+no such tiles. A missed duplicate only costs one OCR pass or upload, a false
+match would hand back another document's text, so anything without a
+signature to compare against is never a duplicate.
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import metrics
+
+WORK_SIZE = 256
+PHASH_RADIUS = 10  # Candidate search radius, in bits of 64
+DHASH_MAX_DISTANCE = 160  # Candidate threshold, in bits of 1024
+CONTENT_SIDE = 1536  # Long side of the ink mask; a changed digit is still ~10 px of ink here
+CONTENT_TILE = 16  # Tile size, in mask pixels, for counting unexplained ink
+CONTENT_MAX_TILE_PIXELS = 4  # More unexplained ink than this in any tile means different content
+SIGNATURE_CACHE_BYTES = 64 * 1024 * 1024  # Signatures kept in memory; the rest are read back from SQLite
+MAX_ROWS = 100_000  # Newest images remembered; about 200 bytes each in memory plus the signature in SQLite
+
+
+def image_hashes(data):
+    """
+    Returns (phash, dhash, signature) for encoded image bytes, or None if
+    OpenCV cannot decode them. JPEGs are decoded at 1/2 scale when that still
+    leaves CONTENT_SIDE pixels for the signature.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    gray = None
+    if bytes(data[:2]) == b"\xff\xd8":
+        gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+        if gray is not None and max(gray.shape) < CONTENT_SIDE:
+            gray = None  # Small photo: decode it at full size instead
+    if gray is None:
+        gray = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    return array_hashes(gray)
+
+
+def array_hashes(gray):
+    """(phash, dhash, signature) of a grayscale NumPy image."""
+    work = cv2.resize(gray, (WORK_SIZE, WORK_SIZE), interpolation=cv2.INTER_AREA)
+
+    small = cv2.resize(work, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    phash_bits = low > np.median(low[1:])  # The DC term would skew the median
+
+    grid = cv2.resize(work, (33, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dhash_bits = grid[:, 1:] > grid[:, :-1]
+
+    return _bits_to_int(phash_bits), _bits_to_int(dhash_bits), content_signature(gray)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def content_signature(gray):
+    """
+    Ink mask of a grayscale image scaled to CONTENT_SIDE on the long side, as
+    bytes: height and width (2 bytes each) and the zlib-compressed packed
+    bits. A scanned A4 page comes to about 5 KB.
+    """
+    scale = CONTENT_SIDE / max(gray.shape)
+    size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+    work = cv2.resize(gray, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+    # Local mean thresholding ignores lighting and paper tone, so brightened or re-exposed copies give the same ink
+    ink = cv2.adaptiveThreshold(work, 1, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    header = ink.shape[0].to_bytes(2, "big") + ink.shape[1].to_bytes(2, "big")
+    return header + zlib.compress(np.packbits(ink).tobytes(), 6)
+
+
+def _signature_mask(signature):
+    height, width = int.from_bytes(signature[:2], "big"), int.from_bytes(signature[2:4], "big")
+    bits = np.unpackbits(np.frombuffer(zlib.decompress(signature[4:]), dtype=np.uint8), count=height * width)
+    return bits.reshape(height, width)
+
+
+def same_content(signature, other):
+    """
+    True if two content signatures show the same page: every ink pixel of
+    each lies within a pixel of ink in the other, up to a few pixels per tile.
+    """
+    first, second = _signature_mask(signature), _signature_mask(other)
+    if abs(first.shape[0] / first.shape[1] - second.shape[0] / second.shape[1]) > 0.01:
+        return False  # Different aspect ratio: cropped, padded or simply another page
+    if first.shape != second.shape:  # Off by a pixel from rounding
+        second = cv2.resize(second, (first.shape[1], first.shape[0]), interpolation=cv2.INTER_NEAREST)
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    unexplained = (first & (1 - cv2.dilate(second, kernel))) | (second & (1 - cv2.dilate(first, kernel)))
+    unexplained = np.pad(unexplained, [(0, -side % CONTENT_TILE) for side in unexplained.shape])
+    rows, columns = (side // CONTENT_TILE for side in unexplained.shape)
+    tiles = unexplained.reshape(rows, CONTENT_TILE, columns, CONTENT_TILE).sum(axis=(1, 3), dtype=np.uint32)
+    return int(tiles.max()) <= CONTENT_MAX_TILE_PIXELS
+
+
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def hamming_many(hashes, value):
+    """Hamming distances from `value` to every row of an (n, k) uint8 array of packed hashes."""
+    query = np.frombuffer(value.to_bytes(hashes.shape[1], "big"), dtype=np.uint8)
+    return _POPCOUNT[hashes ^ query].sum(axis=1, dtype=np.uint32)
+
+
+class HashArray:
+    """
+    Packed hashes in one growable (n, bytes) uint8 array, searched with a
+    vectorised XOR + popcount scan. At the radius used here a BK-tree prunes
+    poorly, and the scan is several times faster up to hundreds of thousands
+    of entries.
+    """
+
+    def __init__(self, bits):
+        self._width = bits // 8
+        self._data = np.zeros((64, self._width), dtype=np.uint8)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])  # Amortised doubling
+        self._data[self._size] = np.frombuffer(value.to_bytes(self._width, "big"), dtype=np.uint8)
+        self._size += 1
+
+    def drop_oldest(self, count):
+        """Removes the first `count` rows; the rest move down by `count`."""
+        self._data[:self._size - count] = self._data[count:self._size]
+        self._size -= count
+
+    def distances(self, value, rows=None):
+        """Distances to every stored hash, or to the given row indices only."""
+        data = self._data[:self._size] if rows is None else self._data[rows]
+        return hamming_many(data, value)
+
+
+class NearDuplicateIndex:
+    """
+    Remembers hashed images together with what we know about them:
+
+    - kind "ocr":    scope = pipeline configuration id, value = OCR cache key
+    - kind "upload": scope = reference number, value = uploaded file title
+
+    Optionally mirrored to SQLite so it survives restarts, like FolderIndex.
+    Hashes stay in memory; content signatures are kept up to
+    SIGNATURE_CACHE_BYTES, least recently used first out, and read back from
+    SQLite when needed again. Only the newest `max_rows` images are kept, in
+    memory and in SQLite: once the index grows past that, the oldest quarter
+    is dropped in one go.
+    """
+
+    def __init__(self, sqlite_path=None, phash_radius=PHASH_RADIUS, dhash_max_distance=DHASH_MAX_DISTANCE,
+                 signature_cache_bytes=SIGNATURE_CACHE_BYTES, max_rows=MAX_ROWS):
+        self.phash_radius = phash_radius
+        self.dhash_max_distance = dhash_max_distance
+        self.signature_cache_bytes = signature_cache_bytes
+        self.max_rows = max_rows
+        self._phashes = HashArray(64)
+        self._dhashes = HashArray(1024)
+        self._records = []  # (kind, scope, value) per row
+        self._rowids = []  # SQLite rowid per row, None without SQLite
+        self._signatures = OrderedDict()  # row -> signature, most recently used last
+        self._signature_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS near_duplicates ("
+                "phash TEXT NOT NULL, dhash TEXT NOT NULL, kind TEXT NOT NULL, scope TEXT NOT NULL, value TEXT NOT NULL, "
+                "signature BLOB)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(near_duplicates)")]
+            if "signature" not in columns:  # Rows from before signatures never confirm a match
+                self._db.execute("ALTER TABLE near_duplicates ADD COLUMN signature BLOB")
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT rowid, phash, dhash, kind, scope, value FROM near_duplicates ORDER BY rowid DESC LIMIT ?",
+                (self.max_rows,),
+            ).fetchall()
+            for rowid, phash, dhash, kind, scope, value in reversed(rows):
+                self._append((int(phash, 16), int(dhash, 16)), kind, scope, value, rowid)
+            if rows:
+                self._db.execute("DELETE FROM near_duplicates WHERE rowid < ?", (rows[-1][0],))
+                self._db.commit()
+
+    def add(self, hashes, kind, scope, value):
+        """`hashes` is (phash, dhash, signature) from image_hashes; a None signature never matches."""
+        phash, dhash, signature = hashes
+        with self._lock:
+            rowid = None
+            if self._db is not None:
+                rowid = self._db.execute(
+                    "INSERT INTO near_duplicates (phash, dhash, kind, scope, value, signature) VALUES (?, ?, ?, ?, ?, ?)",
+                    (f"{phash:016x}", f"{dhash:0256x}", kind, str(scope), value, signature),
+                ).lastrowid
+                self._db.commit()
+            row = self._append((phash, dhash), kind, str(scope), value, rowid)
+            if signature is not None:
+                self._cache_signature(row, signature)
+            if len(self._records) > self.max_rows:
+                self._drop_oldest(len(self._records) - self.max_rows * 3 // 4)
+
+    def find(self, hashes, kind, scope):
+        """
+        Returns (dhash_distance, value) of the closest match whose content is
+        confirmed the same, or None.
+        """
+        phash, dhash, signature = hashes
+        best = None
+        rejected = False
+        with self._lock:
+            if len(self._records) and signature is not None:
+                candidates = np.flatnonzero(self._phashes.distances(phash) <= self.phash_radius)
+                candidates = [row for row in candidates if self._records[row][:2] == (kind, str(scope))]
+                if candidates:
+                    distances = self._dhashes.distances(dhash, candidates)
+                    for index in np.argsort(distances, kind="stable"):
+                        if distances[index] > self.dhash_max_distance:
+                            break
+                        stored = self._signature(candidates[index])
+                        if stored is not None and same_content(signature, stored):
+                            best = (int(distances[index]), self._records[candidates[index]][2])
+                            break
+                        rejected = True  # Looks alike, but the ink differs (or can't be compared)
+        metrics.inc("near_duplicate_lookups_total", kind=kind, result="hit" if best else "rejected" if rejected else "miss")
+        return best
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    def _append(self, hashes, kind, scope, value, rowid=None):
+        """Caller holds self._lock (or is __init__). Returns the new row."""
+        self._phashes.append(hashes[0])
+        self._dhashes.append(hashes[1])
+        self._records.append((kind, scope, value))
+        self._rowids.append(rowid)
+        return len(self._records) - 1
+
+    def _drop_oldest(self, count):
+        """Caller holds self._lock. Forgets the `count` oldest rows; row numbers shift down by `count`."""
+        self._phashes.drop_oldest(count)
+        self._dhashes.drop_oldest(count)
+        del self._records[:count]
+        dropped_rowids = [rowid for rowid in self._rowids[:count] if rowid is not None]
+        del self._rowids[:count]
+        signatures = OrderedDict((row - count, signature) for row, signature in self._signatures.items() if row >= count)
+        self._signatures = signatures
+        self._signature_bytes = sum(len(signature) for signature in signatures.values())
+        if dropped_rowids:
+            self._db.execute("DELETE FROM near_duplicates WHERE rowid <= ?", (max(dropped_rowids),))
+            self._db.commit()
+        metrics.inc("near_duplicate_rows_dropped_total", count)
+
+    def _signature(self, row):
+        """Caller holds self._lock. The row's signature from memory or SQLite, or None."""
+        signature = self._signatures.get(row)
+        if signature is not None:
+            self._signatures.move_to_end(row)
+            return signature
+        if self._db is None or self._rowids[row] is None:
+            return None
+        signature = self._db.execute(
+            "SELECT signature FROM near_duplicates WHERE rowid = ?", (self._rowids[row],)
+        ).fetchone()[0]
+        if signature is not None:
+            self._cache_signature(row, signature)
+        return signature
+
+    def _cache_signature(self, row, signature):
+        """Caller holds self._lock."""
+        self._signatures[row] = signature
+        self._signature_bytes += len(signature)
+        while self._signature_bytes > self.signature_cache_bytes and len(self._signatures) > 1:
+            self._signature_bytes -= len(self._signatures.popitem(last=False)[1])
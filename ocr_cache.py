@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class OCRCache:
+    """
+    Two-tier cache for OCR results, keyed on the SHA-256 of the uploaded bytes
+    plus the preprocessing and Tesseract configuration.
+
+    The memory tier is an LRU capped by total stored bytes. The optional disk
+    tier is a SQLite file so results survive process restarts.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_path=None):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(data, **config):
+        """Builds the cache key from raw image bytes and any pipeline settings."""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("ocr_cache_total", result="hit")
+                return self._entries[key][0]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM ocr_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    metrics.inc("ocr_cache_total", result="disk_hit")
+                    self._store(key, row[0])  # Promote to the memory tier
+                    return row[0]
+
+            self.misses += 1
+            metrics.inc("ocr_cache_total", result="miss")
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+                self._db.commit()
+
+    def _store(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return  # Too large for the memory tier; the disk tier still has it
+
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._size += size
+
+        while self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
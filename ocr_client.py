@@ -0,0 +1,103 @@
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+
+class OCRServiceBusy(Exception):
+    """The service kept answering 429 after all retries."""
+
+
+class OCRServiceClient:
+    """Small stdlib HTTP client for ocr_service.py, used by the Streamlit app."""
+
+    def __init__(self, base_url, timeout=300, retries=5):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+
+    def ocr(self, data, filename, preset="classic", lang=None):
+        """OCRs one image or document and returns its list of page texts. `lang` may be "auto"."""
+        query = urllib.parse.urlencode(self._params(filename=filename, preset=preset, lang=lang))
+        response = self._request("POST", f"/ocr?{query}", data, "application/octet-stream")
+        if response.get("error"):
+            raise RuntimeError(response["error"])
+        return response["pages"]
+
+    def submit_batch(self, files, preset="classic", lang=None):
+        """Queues [(name, bytes), ...] and returns the job id."""
+        boundary = uuid.uuid4().hex
+        body = bytearray()
+        for name, data in files:
+            body += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                "Content-Type: application/octet-stream\r\n\r\n"
+            ).encode("utf-8")
+            body += data
+            body += b"\r\n"
+        body += f"--{boundary}--\r\n".encode("utf-8")
+        query = urllib.parse.urlencode(self._params(preset=preset, lang=lang))
+        response = self._request(
+            "POST", f"/ocr/batch?{query}", bytes(body), f"multipart/form-data; boundary={boundary}"
+        )
+        return response["id"]
+
+    def job(self, job_id):
+        """The job's status dict. Raises RuntimeError for an unknown job (expired, or the service restarted)."""
+        response = self._request("GET", f"/jobs/{job_id}")
+        if response.get("error"):
+            raise RuntimeError(f"OCR job {job_id}: {response['error']}")
+        return response
+
+    def iter_batch(self, files, preset="classic", lang=None, poll_interval=0.5):
+        """
+        Submits a batch and yields (position, text, error) for each file as
+        the service finishes it, positions matching the order of `files`.
+        An empty list yields nothing and sends no request. If the service
+        forgets the job, the files not yet reported are yielded as failed.
+        """
+        if not files:
+            return
+        job_id = self.submit_batch(files, preset, lang)
+        reported = set()
+        while len(reported) < len(files):
+            try:
+                job = self.job(job_id)
+            except RuntimeError as e:
+                for position in range(len(files)):
+                    if position not in reported:
+                        yield position, "", str(e)
+                return
+            for position, item in enumerate(job["items"]):
+                if position not in reported and item["status"] in ("done", "failed"):
+                    reported.add(position)
+                    yield position, "\n\n".join(item["pages"] or []), item["error"]
+            if len(reported) < len(files):
+                time.sleep(poll_interval)
+
+    @staticmethod
+    def _params(**params):
+        return {key: value for key, value in params.items() if value is not None}
+
+    def _request(self, method, path, data=None, content_type=None):
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(self.base_url + path, data=data, method=method)
+            if content_type:
+                request.add_header("Content-Type", content_type)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                if e.code == 429 and attempt < self.retries:
+                    # Service is saturated; honour its Retry-After
+                    time.sleep(float(e.headers.get("Retry-After", 1)) * (attempt + 1))
+                    continue
+                if e.code == 429:
+                    raise OCRServiceBusy("OCR service is saturated") from e
+                try:
+                    return json.loads(e.read())  # Job-level failures carry a JSON body
+                except ValueError:
+                    raise e
@@ -0,0 +1,231 @@
+import os
+import queue
+import shlex
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pytesseract
+
+# libtesseract's GetTSVText omits the header line the CLI writes
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+
+class ScriptDetectionUnavailable(Exception):
+    """OSD cannot run on this host at all: no tesseract binary, or no osd model."""
+
+
+class PytesseractEngine:
+    """The original path: one temp file and one fresh `tesseract` process per call."""
+
+    name = "pytesseract"
+
+    def __init__(self, lang="eng"):
+        self.lang = lang
+
+    def image_to_string(self, image, config=""):
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def image_to_data(self, image, config=""):
+        """Tesseract's TSV output: one row per page/block/paragraph/line/word with boxes and confidences."""
+        return pytesseract.image_to_data(image, lang=self.lang, config=config)
+
+    def detect_script(self, image):
+        """
+        Tesseract OSD: returns (script name, confidence), e.g. ("Sinhala", 3.2).
+        Raises TesseractError when the image has too little text to decide.
+        """
+        try:
+            osd = pytesseract.image_to_osd(image, config="--psm 0", output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractNotFoundError as e:
+            raise ScriptDetectionUnavailable(str(e)) from e
+        except pytesseract.TesseractError as e:
+            if "osd" in str(e.message) and "Failed loading language" in str(e.message):
+                raise ScriptDetectionUnavailable("Tesseract has no osd model (osd.traineddata)") from e
+            raise
+        return osd["script"], float(osd["script_conf"])
+
+
+class TesserocrEngine:
+    """
+    Keeps warm libtesseract instances (via tesserocr) and feeds them images in
+    memory, so the language model is loaded once per instance instead of once
+    per call. tesserocr releases the GIL while recognising, so instances can be
+    used from several threads at once.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang="eng", size=None):
+        import tesserocr  # Optional dependency; get_engine() falls back without it
+
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.size = size or os.cpu_count() or 1
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used instance hot
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._osd = None  # Separate instance with the osd model, created on first detect_script
+        self._osd_lock = threading.Lock()
+
+    def _acquire(self):
+        while True:
+            try:
+                api = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if self._closed:
+                        # Evicted by get_engine while a caller still held it: serve it with a one-off instance
+                        return self._tesserocr.PyTessBaseAPI(lang=self.lang)
+                    if self._created < self.size:
+                        self._created += 1
+                        return self._tesserocr.PyTessBaseAPI(lang=self.lang)
+                api = self._idle.get()  # Pool is full; wait for a free instance
+            if api is not None:
+                return api
+            # None wakes a waiter after close(); go round again for a one-off instance
+
+    def _release(self, api, overrides):
+        """Restores the -c variables the call set (Clear() keeps them) and returns the instance."""
+        for key, value in reversed(overrides):
+            api.SetVariable(key, value)
+        with self._lock:
+            if not self._closed:
+                self._idle.put(api)
+                return
+        api.End()
+        self._idle.put(None)  # Wakes a thread still waiting on the closed engine
+
+    def image_to_string(self, image, config=""):
+        api = self._acquire()
+        overrides = []
+        try:
+            self._prepare(api, image, config, overrides)
+            return api.GetUTF8Text()
+        finally:
+            self._release(api, overrides)
+
+    def image_to_data(self, image, config=""):
+        """Same TSV layout as pytesseract.image_to_data, header row included."""
+        api = self._acquire()
+        overrides = []
+        try:
+            self._prepare(api, image, config, overrides)
+            return TSV_HEADER + api.GetTSVText(0)
+        finally:
+            self._release(api, overrides)
+
+    def detect_script(self, image):
+        """
+        Tesseract OSD: returns (script name, confidence), e.g. ("Sinhala", 3.2).
+        Raises RuntimeError when the image has too little text to decide.
+        """
+        with self._osd_lock:
+            if self._osd is None:
+                try:
+                    self._osd = self._tesserocr.PyTessBaseAPI(lang="osd", psm=self._tesserocr.PSM.OSD_ONLY)
+                except RuntimeError as e:  # tesserocr's "Failed to init API": no osd.traineddata
+                    raise ScriptDetectionUnavailable(f"Tesseract has no osd model (osd.traineddata): {e}") from e
+            self._osd.Clear()
+            self._set_image(self._osd, image)
+            result = self._osd.DetectOrientationScript()
+        if not result:
+            raise RuntimeError("Tesseract could not detect the script")
+        return result["script_name"], float(result["script_conf"])
+
+    def _prepare(self, api, image, config, overrides):
+        api.Clear()
+        self._apply_config(api, config, overrides)
+        self._set_image(api, image)
+
+    @staticmethod
+    def _set_image(api, image):
+        if isinstance(image, np.ndarray):
+            # Raw pixels; SetImage would re-encode a PIL image in memory first
+            image = np.ascontiguousarray(image)
+            height, width = image.shape[:2]
+            channels = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+        else:
+            api.SetImage(image)
+
+    def _apply_config(self, api, config, overrides):
+        """
+        Applies the subset of Tesseract CLI options we use (--psm and -c).
+        Appends (key, previous value) to `overrides` for every -c variable set.
+        """
+        args = shlex.split(config)
+        api.SetPageSegMode(self._tesserocr.PSM.AUTO)
+        for index, arg in enumerate(args[:-1]):
+            if arg == "--psm":
+                api.SetPageSegMode(int(args[index + 1]))
+            elif arg == "-c":
+                key, _, value = args[index + 1].partition("=")
+                previous = api.GetVariableAsString(key)
+                if api.SetVariable(key, value) and previous is not None:
+                    overrides.append((key, previous))
+
+    def close(self):
+        """
+        Ends the idle instances. Instances in use are ended when released, and
+        callers still holding the engine get one-off instances.
+        """
+        with self._lock:
+            self._closed = True
+        wakeups = 0
+        while True:
+            try:
+                api = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if api is None:
+                wakeups += 1
+            else:
+                api.End()
+        for _ in range(wakeups):
+            self._idle.put(None)  # Meant for waiters, not for us
+        with self._osd_lock:
+            if self._osd is not None:
+                self._osd.End()
+                self._osd = None
+
+
+_engines = OrderedDict()  # Language set -> engine, least recently used first
+_engine_lock = threading.Lock()
+
+
+def create_engine(kind="auto", lang="eng"):
+    """
+    Creates an OCR engine. "auto" uses warm tesserocr workers when the library
+    is installed and falls back to the pytesseract subprocess path otherwise.
+    """
+    if kind == "pytesseract":
+        return PytesseractEngine(lang)
+    try:
+        return TesserocrEngine(lang)
+    except ImportError:
+        if kind == "tesserocr":
+            raise
+        return PytesseractEngine(lang)
+
+
+def get_engine(lang=None):
+    """
+    Returns the process-wide engine for a language set such as "sin+eng"
+    (default: OCR_LANG, else "eng"), chosen by the OCR_ENGINE environment
+    variable. Engines stay warm per language set; beyond OCR_MAX_LANGUAGE_SETS
+    the least recently used set is closed, since each holds its own models.
+    """
+    lang = lang or os.environ.get("OCR_LANG", "eng")
+    with _engine_lock:
+        engine = _engines.get(lang)
+        if engine is not None:
+            _engines.move_to_end(lang)
+            return engine
+        engine = _engines[lang] = create_engine(os.environ.get("OCR_ENGINE", "auto"), lang)
+        while len(_engines) > int(os.environ.get("OCR_MAX_LANGUAGE_SETS", 4)):
+            _, evicted = _engines.popitem(last=False)
+            if hasattr(evicted, "close"):
+                evicted.close()
+        return engine
@@ -0,0 +1,140 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+import metrics
+from document_pages import is_multipage_document, iter_document_pages
+from language_detect import resolve_language
+from ocr_engine import get_engine
+from preprocessing import PRESETS, run_pipeline
+
+# Settings that change the OCR output, so they are part of the cache key
+PREPROCESS_CONFIG = PRESETS["classic"]
+TESSERACT_CONFIG = ""
+DRAFT_MIN_SIDE = 2400  # Larger JPEGs are decoded at 1/2, 1/4 or 1/8 scale, never below this
+EXIF_ORIENTATION = 0x0112
+TRANSPOSING_ORIENTATIONS = {5, 6, 7, 8}  # Quarter turns: the displayed width is the stored height
+
+
+def decode_image(data):
+    """
+    Decodes upload bytes, shrinking very large JPEGs during decode (Image.draft)
+    so full-resolution pixels are never materialised. Returns (image, original_size).
+    """
+    with metrics.span("decode"):
+        image = Image.open(io.BytesIO(data))
+        original_size = image.size
+        if image.format == "JPEG":
+            ratio = DRAFT_MIN_SIDE / max(original_size)
+            if ratio <= 0.5:
+                image.draft("RGB", (int(original_size[0] * ratio) + 1, int(original_size[1] * ratio) + 1))
+                if "dpi" in image.info:  # Keep DPI consistent with the reduced pixel count
+                    scale = image.size[0] / original_size[0]
+                    image.info["dpi"] = tuple(value * scale for value in image.info["dpi"])
+    return image, original_size
+
+
+def read_header(data):
+    """
+    Returns (format, size, dpi) from the file header without decoding any
+    pixels. `size` is as displayed, i.e. after the EXIF orientation, which
+    cv2.imdecode applies.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        size = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSING_ORIENTATIONS:
+            size = size[::-1]
+        return image.format, size, image.info.get("dpi", (None,))[0]
+
+
+def decode_array(data, grayscale=True):
+    """
+    Decodes upload bytes straight into a NumPy array with cv2.imdecode:
+    np.frombuffer wraps the buffer (via the buffer protocol) without copying, and
+    `grayscale` decodes to one channel directly instead of decoding RGB and
+    converting. Very large JPEGs are scaled down inside libjpeg, like
+    decode_image's draft mode. EXIF orientation is applied.
+
+    Returns (array, original_size, dpi); dpi is adjusted for any reduction.
+    Falls back to PIL for formats OpenCV cannot decode.
+    """
+    image_format, original_size, dpi = read_header(data)
+    with metrics.span("decode"):
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        reduction = 1
+        if image_format == "JPEG":
+            ratio = DRAFT_MIN_SIDE / max(original_size)
+            reduction = 8 if ratio <= 0.125 else 4 if ratio <= 0.25 else 2 if ratio <= 0.5 else 1
+            flags = _REDUCED_FLAGS[grayscale].get(reduction, flags)
+        array = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if array is None:  # GIF, some TIFF variants, etc.
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))  # Oriented like cv2.imdecode
+            array = np.asarray(image.convert("L" if grayscale else "RGB"))
+            reduction = 1
+        elif not grayscale:
+            cv2.cvtColor(array, cv2.COLOR_BGR2RGB, dst=array)  # In place; OpenCV decodes BGR
+    return array, original_size, dpi / reduction if dpi else None
+
+
+_REDUCED_FLAGS = {
+    True: {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+    False: {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+}
+
+
+def preprocess_array(array, stages=None, timings=None, source_dpi=None):
+    """Like preprocess_image, but takes and returns a NumPy array (no PIL round-trips)."""
+    stages = stages or PREPROCESS_CONFIG
+    with metrics.span("preprocess"):
+        return run_pipeline(array, with_source_dpi(stages, source_dpi), timings)
+
+
+def with_source_dpi(stages, source_dpi):
+    """Passes the image's DPI to any normalize_dpi stage."""
+    return [
+        [name, {"source_dpi": source_dpi, **params} if name == "normalize_dpi" else params]
+        for name, params in stages
+    ]
+
+
+def starts_grayscale(stages=None):
+    """True when the pipeline converts to grayscale first, so decoding colour would be wasted."""
+    stages = stages or PREPROCESS_CONFIG
+    return bool(stages) and stages[0][0] == "grayscale"
+
+
+# Preprocess Image for OCR
+def preprocess_image(image, stages=None, timings=None):
+    """Runs the preprocessing stages (default: PREPROCESS_CONFIG) and returns a PIL image."""
+    stages = stages or PREPROCESS_CONFIG
+    with metrics.span("preprocess"):
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")  # Palette, CMYK, 16-bit etc.
+        source_dpi = image.info.get("dpi", (None,))[0]
+        return Image.fromarray(run_pipeline(np.asarray(image), with_source_dpi(stages, source_dpi), timings))
+
+
+# OCR Function (warm tesserocr workers when available, pytesseract otherwise)
+def extract_text_tesseract(image, config=None, lang=None):
+    """`lang` is a Tesseract language set ("sin+eng"), "auto" to detect it, or None for OCR_LANG."""
+    lang = resolve_language(image, lang)
+    with metrics.span("tesseract"):
+        return get_engine(lang).image_to_string(image, config=TESSERACT_CONFIG if config is None else config)
+
+
+def ocr_image_bytes(data, stages=None, lang=None):
+    """Runs the full decode -> preprocess -> Tesseract pipeline on raw image bytes, in NumPy throughout."""
+    array, _, dpi = decode_array(data, grayscale=starts_grayscale(stages))
+    return extract_text_tesseract(preprocess_array(array, stages, source_dpi=dpi), lang=lang)
+
+
+def ocr_document_bytes(data, filename="", stages=None, lang=None):
+    """OCRs an image, PDF or TIFF and returns one text per page (with lang="auto", detected per page)."""
+    if not is_multipage_document(filename):
+        return [ocr_image_bytes(data, stages, lang)]
+    return [
+        extract_text_tesseract(preprocess_image(page, stages), lang=lang)
+        for _, page in iter_document_pages(data, filename)
+    ]
@@ -0,0 +1,233 @@
+"""
+Headless OCR service sharing the app's pipeline.
+
+    python ocr_service.py --port 8080 --workers 4 --max-queue 64
+
+    POST /ocr?preset=classic&filename=scan.pdf   body: raw image/PDF/TIFF bytes
+    POST /ocr/batch?preset=classic                body: multipart files (images or ZIPs)
+         &lang=sin+eng | auto                     optional on both; default OCR_LANG
+    GET  /jobs/{id}
+    GET  /healthz
+    GET  /metrics                                 Prometheus text format
+
+Work goes through a bounded queue drained by one dispatcher per pool worker.
+When the queue is full the service answers 429 with Retry-After instead of
+accepting more work than it can finish.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+import metrics
+from batch_ocr import create_ocr_pool, expand_upload, run_measured
+from ocr_cache import OCRCache
+from ocr_pipeline import TESSERACT_CONFIG, ocr_document_bytes
+from preprocessing import PRESETS
+
+MAX_JOBS_KEPT = 1000
+
+
+class OCRService:
+    def __init__(self, workers=None, max_queue=64, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = create_ocr_pool(self.workers)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.cache = cache or OCRCache()
+        self.jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._dispatchers = []
+
+    async def start(self, app=None):
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self, app=None):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    def new_job(self, names):
+        job = {
+            "id": str(next(self._ids)),
+            "status": "queued",
+            "created": time.time(),
+            "items": [{"name": name, "status": "queued", "pages": None, "error": None} for name in names],
+        }
+        self.jobs[job["id"]] = job
+        while len(self.jobs) > MAX_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+        return job
+
+    def enqueue(self, job, payloads, stages, lang=None):
+        """Queues every item of the job, or none of them if the queue lacks room."""
+        if self.queue.maxsize - self.queue.qsize() < len(payloads):
+            raise asyncio.QueueFull
+        done = asyncio.get_running_loop().create_future()
+        job["_remaining"] = len(payloads)
+        job["_done"] = done
+        for item, (name, data) in zip(job["items"], payloads):
+            self.queue.put_nowait((job, item, name, data, stages, lang))
+        metrics.set_gauge("ocr_queue_depth", self.queue.qsize())
+        return done
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, item, name, data, stages, lang = await self.queue.get()
+            job["status"] = item["status"] = "running"
+            try:
+                # Pages are stored as a JSON list: Tesseract ends every page's text with "\f" itself
+                cache_key = self.cache.make_key(
+                    data, preprocess=stages, tesseract=TESSERACT_CONFIG, lang=lang, filename=name, pages="json"
+                )
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    item["pages"] = json.loads(cached)
+                else:
+                    pages, error, worker_metrics = await loop.run_in_executor(
+                        self.pool, run_measured, ocr_document_bytes, data, name, stages, lang
+                    )
+                    metrics.merge(worker_metrics)
+                    if error:
+                        raise RuntimeError(error)
+                    item["pages"] = pages
+                    self.cache.put(cache_key, json.dumps(item["pages"]))
+                item["status"] = "done"
+            except Exception as e:
+                item["status"] = "failed"
+                item["error"] = str(e)
+                metrics.inc("ocr_errors_total", mode="service")
+            finally:
+                self.queue.task_done()
+                metrics.set_gauge("ocr_queue_depth", self.queue.qsize())
+                job["_remaining"] -= 1
+                if job["_remaining"] == 0:
+                    failed = all(entry["status"] == "failed" for entry in job["items"])
+                    job["status"] = "failed" if failed else "done"
+                    job["_done"].set_result(None)
+
+
+def public_job(job):
+    return {key: value for key, value in job.items() if not key.startswith("_")}
+
+
+def stages_for(request):
+    preset = request.query.get("preset", "classic")
+    if preset not in PRESETS:
+        raise web.HTTPBadRequest(text=f"Unknown preset: {preset}")
+    return PRESETS[preset]
+
+
+def lang_for(request):
+    lang = request.query.get("lang") or None
+    if lang is not None and not re.fullmatch(r"auto|[a-z_]+(\+[a-z_]+)*", lang, re.IGNORECASE):
+        raise web.HTTPBadRequest(text=f"Invalid lang: {lang}")
+    return lang
+
+
+def too_busy():
+    metrics.inc("ocr_rejected_total")
+    return web.json_response({"error": "OCR queue is full, retry later"}, status=429, headers={"Retry-After": "2"})
+
+
+async def handle_ocr(request):
+    service = request.app["service"]
+    metrics.inc("ocr_requests_total", endpoint="ocr")
+    stages = stages_for(request)
+    lang = lang_for(request)
+    name = request.query.get("filename", "upload.png")
+    data = await request.read()
+    if not data:
+        raise web.HTTPBadRequest(text="Empty request body")
+
+    job = service.new_job([name])
+    try:
+        done = service.enqueue(job, [(name, data)], stages, lang)
+    except asyncio.QueueFull:
+        service.jobs.pop(job["id"], None)
+        return too_busy()
+    await done
+    item = job["items"][0]
+    status = 200 if item["status"] == "done" else 500
+    return web.json_response({"job_id": job["id"], **item}, status=status)
+
+
+async def handle_batch(request):
+    service = request.app["service"]
+    metrics.inc("ocr_requests_total", endpoint="batch")
+    stages = stages_for(request)
+    lang = lang_for(request)
+    payloads = []
+    reader = await request.multipart()
+    async for part in reader:
+        if part.filename:
+            payloads.extend(expand_upload(part.filename, await part.read(decode=False)))
+    if not payloads:
+        raise web.HTTPBadRequest(text="No files in request")
+
+    job = service.new_job([name for name, _ in payloads])
+    try:
+        service.enqueue(job, payloads, stages, lang)
+    except asyncio.QueueFull:
+        service.jobs.pop(job["id"], None)
+        return too_busy()
+    return web.json_response(public_job(job), status=202)
+
+
+async def handle_job(request):
+    job = request.app["service"].jobs.get(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "Unknown job"}, status=404)
+    return web.json_response(public_job(job))
+
+
+async def handle_health(request):
+    service = request.app["service"]
+    return web.json_response({
+        "status": "ok",
+        "workers": service.workers,
+        "queue_depth": service.queue.qsize(),
+        "queue_capacity": service.queue.maxsize,
+    })
+
+
+async def handle_metrics(request):
+    service = request.app["service"]
+    metrics.set_gauge("ocr_queue_depth", service.queue.qsize())
+    metrics.set_gauge("ocr_queue_capacity", service.queue.maxsize)
+    return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+def create_app(workers=None, max_queue=64, max_upload_mb=50):
+    app = web.Application(client_max_size=max_upload_mb * 1024 * 1024)
+    service = OCRService(workers=workers, max_queue=max_queue)
+    app["service"] = service
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    app.router.add_post("/ocr", handle_ocr)
+    app.router.add_post("/ocr/batch", handle_batch)
+    app.router.add_get("/jobs/{job_id}", handle_job)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless OCR service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="OCR processes (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=64, help="queued pages before answering 429")
+    args = parser.parse_args()
+    web.run_app(create_app(args.workers, args.max_queue), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Incremental re-OCR for in-app crop and rotate.
+
+An EditSession decodes an upload once and keeps the page as it comes out of
+the position-independent preprocessing stages, the ones that treat every
+part of the page alike (grayscale, resolution and scale normalisation,
+denoising, thresholding). Cropping and quarter-turn rotation commute with
+those, so an adjustment is just a slice and an np.rot90 view of the cached
+array: nothing is decoded or re-thresholded. Stages that look at the page's
+overall geometry (deskew, crop_border) run afterwards, on the adjusted
+region only.
+
+Cached arrays are made read-only, since adjustments hand out views of them.
+"""
+import json
+
+import cv2
+import numpy as np
+
+import metrics
+from ocr_pipeline import PREPROCESS_CONFIG, decode_array, with_source_dpi
+from preprocessing import run_pipeline
+
+GEOMETRY_STAGES = {"deskew", "crop_border"}  # Depend on the whole page's layout, so they run after cropping
+FULL_BOX = (0.0, 0.0, 1.0, 1.0)
+PREVIEW_SIDE = 1200
+
+
+def split_geometry_stages(stages):
+    """Splits stages into (position-independent prefix, rest from the first geometry stage)."""
+    for index, (name, _) in enumerate(stages):
+        if name in GEOMETRY_STAGES:
+            return stages[:index], stages[index:]
+    return stages, []
+
+
+def adjust(array, rotation=0, box=None):
+    """
+    Rotates by `rotation` quarter turns counter-clockwise, then crops to `box`
+    (left, top, right, bottom as fractions of the rotated image). Returns a
+    view; nothing is copied.
+    """
+    if rotation % 4:
+        array = np.rot90(array, rotation % 4)
+    if box and tuple(box) != FULL_BOX:
+        height, width = array.shape[:2]
+        left, top, right, bottom = box
+        top_px, left_px = int(round(top * height)), int(round(left * width))
+        array = array[
+            top_px:max(int(round(bottom * height)), top_px + 1),
+            left_px:max(int(round(right * width)), left_px + 1),
+        ]
+    return array
+
+
+def adjust_matrix(shape, rotation=0, box=None):
+    """3x3 matrix mapping pixel coordinates of an array of `shape` to those of adjust()'s result."""
+    height, width = shape[:2]
+    matrix = np.eye(3)
+    for _ in range(rotation % 4):
+        # np.rot90 turns counter-clockwise: (x, y) -> (y, width - x)
+        matrix = np.array([[0.0, 1.0, 0.0], [-1.0, 0.0, width], [0.0, 0.0, 1.0]]) @ matrix
+        height, width = width, height
+    if box and tuple(box) != FULL_BOX:
+        left, top = box[:2]
+        matrix = np.array([[1.0, 0.0, -int(round(left * width))], [0.0, 1.0, -int(round(top * height))], [0.0, 0.0, 1.0]]) @ matrix
+    return matrix
+
+
+def adjusted_size(size, rotation=0, box=None):
+    """(width, height) of an image of `size` after adjust()."""
+    width, height = size if rotation % 2 == 0 else size[::-1]
+    left, top, right, bottom = box or FULL_BOX
+    return max(int(round((right - left) * width)), 1), max(int(round((bottom - top) * height)), 1)
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class EditSession:
+    """
+    One upload, decoded once, with its position-independent preprocessing
+    cached for the most recently used pipeline. Meant to live in a Streamlit
+    session while the user adjusts the page.
+    """
+
+    def __init__(self, data, grayscale=True):
+        source, self.original_size, self.dpi = decode_array(data, grayscale=grayscale)
+        self.source = _read_only(source)
+        self._prefix_key = None
+        self._prefix = None
+        self._prefix_transform = None
+        self._preview = None
+
+    def preprocessed(self, stages=None, rotation=0, box=None, timings=None, transform=None):
+        """
+        The adjusted region, preprocessed with `stages`. Only geometry stages
+        touch new pixels. If `transform` is a 3x3 array, it is set to the
+        matrix mapping the upload's pixel coordinates (original_size) to the
+        result's.
+        """
+        local, geometric = split_geometry_stages(with_source_dpi(stages or PREPROCESS_CONFIG, self.dpi))
+        with metrics.span("preprocess"):
+            key = json.dumps(local, sort_keys=True)
+            if key != self._prefix_key:
+                metrics.inc("edit_prefix_cache_total", result="miss")
+                # From the upload's pixels, through any reduced decode, to the prefix's
+                prefix_transform = np.diag([
+                    self.source.shape[1] / self.original_size[0], self.source.shape[0] / self.original_size[1], 1.0,
+                ])
+                self._prefix = _read_only(run_pipeline(self.source, local, timings, prefix_transform))
+                self._prefix_transform = prefix_transform
+                self._prefix_key = key
+            else:
+                metrics.inc("edit_prefix_cache_total", result="hit")
+            region = adjust(self._prefix, rotation, box)
+            if transform is not None:
+                transform[:] = adjust_matrix(self._prefix.shape, rotation, box) @ self._prefix_transform
+            return run_pipeline(region, geometric, timings, transform) if geometric else region
+
+    def source_region(self, rotation=0, box=None):
+        """The adjusted region of the decoded page, for callers that preprocess it themselves."""
+        return adjust(self.source, rotation, box)
+
+    def preview(self, rotation=0, box=None):
+        """A downscaled adjusted copy for display; the downscale is done once per session."""
+        if self._preview is None:
+            scale = min(1.0, PREVIEW_SIDE / max(self.source.shape[:2]))
+            preview = cv2.resize(self.source, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else self.source
+            self._preview = _read_only(preview)
+        return np.ascontiguousarray(adjust(self._preview, rotation, box))
+
+    def size(self, rotation=0, box=None):
+        """Size of the adjusted region in the upload's original pixels."""
+        return adjusted_size(self.original_size, rotation, box)
@@ -0,0 +1,203 @@
+"""
+Configurable image preprocessing for OCR.
+
+A pipeline is a list of [stage_name, params] pairs. Every stage takes and
+returns a single uint8 NumPy array and is built from whole-array NumPy/OpenCV
+operations, so there are no per-pixel Python loops and no PIL round-trips
+between stages. Each stage's wall time is recorded so its cost can be weighed
+against the accuracy it buys.
+"""
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from presets import PRESETS  # noqa: F401  Re-exported; the presets are plain data
+
+
+def grayscale(array):
+    if array.ndim == 2:
+        return array
+    code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(array, code)
+
+
+def normalize_dpi(gray, source_dpi=None, target_dpi=300):
+    """Rescales to target_dpi when the source resolution is known."""
+    if not source_dpi or source_dpi == target_dpi:
+        return gray
+    scale = target_dpi / source_dpi
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def estimate_x_height(gray, sample_side=1000):
+    """
+    Estimates the text x-height in pixels as the median height of glyph-sized
+    connected components (lowercase letters dominate running text). Runs on
+    a downsampled copy, so the cost does not grow with the input resolution.
+    Returns None if no text is found.
+    """
+    scale = min(1.0, sample_side / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    ink = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    heights = stats[1:count, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:count, cv2.CC_STAT_WIDTH]
+    # Keep glyph-like blobs: not specks, not lines or images
+    glyphs = (heights >= 3) & (heights <= small.shape[0] / 8) & (widths <= heights * 3)
+    if glyphs.sum() < 10:
+        return None
+    return float(np.median(heights[glyphs])) / scale
+
+
+CAP_TO_X_HEIGHT = 1.4  # Typical Latin cap height / x-height ratio
+
+
+def normalize_scale(gray, target_cap_height=30, tolerance=0.15, min_scale=0.25, max_scale=4.0):
+    """Resamples so capitals are about `target_cap_height` px, Tesseract's sweet spot."""
+    x_height = estimate_x_height(gray)
+    if x_height is None:
+        return gray
+    scale = min(max(target_cap_height / (x_height * CAP_TO_X_HEIGHT), min_scale), max_scale)
+    if abs(scale - 1) <= tolerance:
+        return gray
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def denoise(gray, method="median", strength=3):
+    if method == "median":
+        return cv2.medianBlur(gray, strength | 1)  # Kernel size must be odd
+    if method == "nlmeans":
+        return cv2.fastNlMeansDenoising(gray, None, h=strength * 3)
+    raise ValueError(f"Unknown denoise method: {method}")
+
+
+def deskew(gray, max_angle=15.0):
+    """Rotates the page so text lines are horizontal, using the ink's minimum-area rectangle."""
+    return deskew_affine(gray, max_angle)[0]
+
+
+def deskew_affine(gray, max_angle=15.0):
+    """deskew() that also returns the 2x3 matrix mapping input pixels to output pixels (None if unrotated)."""
+    # The angle is scale-invariant, so estimate it on a small copy with a lighting-robust mask
+    scale = min(1.0, 1000 / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    ink = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return gray, None
+
+    angle = cv2.minAreaRect(points)[-1]
+    # OpenCV versions disagree on the reported range; fold it into (-45, 45]
+    if angle <= -45:
+        angle += 90
+    elif angle > 45:
+        angle -= 90
+    if abs(angle) < 0.1 or abs(angle) > max_angle:
+        return gray, None
+
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return rotated, matrix
+
+
+def sauvola_threshold(gray, window=25, k=0.2, r=128):
+    """
+    Sauvola local threshold computed from box-filtered mean and variance.
+    Only two float32 buffers are allocated; everything else is in place.
+    """
+    # Filter the uint8 page straight into float32 rather than converting a copy first
+    mean = cv2.boxFilter(gray, cv2.CV_32F, (window, window), borderType=cv2.BORDER_REFLECT)
+    buffer = cv2.sqrBoxFilter(gray, cv2.CV_32F, (window, window), borderType=cv2.BORDER_REFLECT)
+    buffer -= np.square(mean)  # Variance
+    np.maximum(buffer, 0, out=buffer)
+    np.sqrt(buffer, out=buffer)  # Standard deviation
+    # threshold = mean * (1 + k * (std / r - 1)), rearranged to update the buffer in place
+    buffer *= k / r
+    buffer += 1 - k
+    buffer *= mean
+    del mean
+    return np.where(gray > buffer, np.uint8(255), np.uint8(0))
+
+
+def threshold(gray, method="global", value=150, invert=False, block_size=31, offset=10, window=25, k=0.2):
+    """Binarises with a fixed, Otsu, adaptive-Gaussian or Sauvola threshold."""
+    if method == "global":
+        flag = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+        return cv2.threshold(gray, value, 255, flag)[1]
+    if method == "otsu":
+        flag = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+        return cv2.threshold(gray, 0, 255, flag | cv2.THRESH_OTSU)[1]
+    if method == "adaptive":
+        flag = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, flag, block_size | 1, offset)
+    if method == "sauvola":
+        binary = sauvola_threshold(gray, window=window, k=k)
+        return cv2.bitwise_not(binary, dst=binary) if invert else binary
+    raise ValueError(f"Unknown threshold method: {method}")
+
+
+def crop_border(gray, margin=10, ink_threshold=128):
+    """Crops to the bounding box of dark content plus a margin (expects dark text on light)."""
+    return crop_border_affine(gray, margin, ink_threshold)[0]
+
+
+def crop_border_affine(gray, margin=10, ink_threshold=128):
+    """crop_border() that also returns the 2x3 matrix mapping input pixels to output pixels (None if uncropped)."""
+    ink = gray < ink_threshold
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return gray, None
+    top, bottom = max(rows[0] - margin, 0), min(rows[-1] + margin + 1, gray.shape[0])
+    left, right = max(cols[0] - margin, 0), min(cols[-1] + margin + 1, gray.shape[1])
+    matrix = np.array([[1.0, 0.0, -left], [0.0, 1.0, -top]])
+    return gray[top:bottom, left:right], matrix  # A view, not a copy
+
+
+STAGES = {
+    "grayscale": grayscale,
+    "normalize_dpi": normalize_dpi,
+    "normalize_scale": normalize_scale,
+    "denoise": denoise,
+    "deskew": deskew,
+    "threshold": threshold,
+    "crop_border": crop_border,
+}
+
+# Stages that move pixels without resizing, in a form that reports how (used when tracking a transform)
+AFFINE_STAGES = {
+    "deskew": deskew_affine,
+    "crop_border": crop_border_affine,
+}
+
+
+def run_pipeline(array, stages, timings=None, transform=None):
+    """
+    Runs the stages over a NumPy image and returns the result. If `timings`
+    is a dict, each stage's duration in seconds is stored under its name.
+    If `transform` is a 3x3 array, it is updated in place so that it maps
+    the input's pixel coordinates to the result's (resizes, deskew rotation
+    and border crops included).
+    """
+    for name, params in stages:
+        started = time.perf_counter()
+        matrix = None
+        if transform is not None and name in AFFINE_STAGES:
+            array, matrix = AFFINE_STAGES[name](array, **params)
+        else:
+            before = array.shape[:2]
+            array = STAGES[name](array, **params)
+            if transform is not None and array.shape[:2] != before:  # A resize
+                matrix = np.array([[array.shape[1] / before[1], 0.0, 0.0], [0.0, array.shape[0] / before[0], 0.0]])
+        if matrix is not None:
+            transform[:] = np.vstack([matrix, [0.0, 0.0, 1.0]]) @ transform
+        elapsed = time.perf_counter() - started
+        metrics.observe("preprocess_stage_seconds", elapsed, stage=name)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+    return array
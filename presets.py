@@ -0,0 +1,29 @@
+"""
+Named preprocessing pipelines (see preprocessing.py for the stages).
+
+Plain data with no imports, so the app can list the presets and build cache
+keys without loading OpenCV.
+"""
+
+PRESETS = {
+    # The original fixed global threshold at 150, inverted
+    "classic": [
+        ["grayscale", {}],
+        ["normalize_scale", {"target_cap_height": 30}],
+        ["threshold", {"method": "global", "value": 150, "invert": True}],
+    ],
+    "otsu": [
+        ["grayscale", {}],
+        ["normalize_scale", {"target_cap_height": 30}],
+        ["threshold", {"method": "otsu"}],
+    ],
+    # For unevenly lit phone photos
+    "adaptive": [
+        ["grayscale", {}],
+        ["normalize_scale", {"target_cap_height": 30}],
+        ["denoise", {"method": "median", "strength": 3}],
+        ["deskew", {}],
+        ["threshold", {"method": "sauvola", "window": 25, "k": 0.2}],
+        ["crop_border", {}],
+    ],
+}
@@ -0,0 +1,79 @@
+"""
+Opt-in profiling of individual slow requests.
+
+    OCR_PROFILE_DIR=profiles OCR_PROFILE_SLOW_MS=2000 streamlit run app.py
+    OCR_PROFILER=pyinstrument ...   # HTML flame view instead of a .prof file
+
+Every wrapped request runs under the profiler, but a profile is only written
+when the request took at least OCR_PROFILE_SLOW_MS. Open .prof files with
+`python -m pstats` or snakeviz. With OCR_PROFILE_DIR unset this is a no-op.
+"""
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+
+def _settings():
+    directory = os.environ.get("OCR_PROFILE_DIR")
+    if not directory:
+        return None
+    return directory, float(os.environ.get("OCR_PROFILE_SLOW_MS", 1000)) / 1000, os.environ.get("OCR_PROFILER", "cprofile")
+
+
+def _start(profiler_name):
+    if profiler_name == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass  # Fall back to cProfile
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _save(profiler, path_stem):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.dump_stats(path_stem + ".prof")
+    else:
+        with open(path_stem + ".html", "w", encoding="utf-8") as out:
+            out.write(profiler.output_html())
+
+
+@contextmanager
+def profile_if_slow(name):
+    """Profiles the block and saves the profile to OCR_PROFILE_DIR if it was slow."""
+    settings = _settings()
+    if settings is None:
+        yield
+        return
+
+    directory, threshold, profiler_name = settings
+    try:
+        profiler = _start(profiler_name)
+    except ValueError:
+        yield  # Another profiler is already active on this thread
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if elapsed >= threshold:
+            os.makedirs(directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path_stem = os.path.join(directory, f"{stamp}-{os.getpid()}-{threading.get_ident()}-{name}")
+            _save(profiler, path_stem)
+            metrics.inc("profiles_saved_total", request=name)
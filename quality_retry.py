@@ -0,0 +1,125 @@
+"""
+Confidence-driven retries: OCR the page once, then re-OCR only the lines
+Tesseract was unsure about, trying alternate preprocessing for each, and keep
+whichever reading scores the highest confidence.
+
+A line is a small crop, so each retry costs a fraction of a full-page pass.
+Retries stop at the page's time budget, lowest-confidence lines first, so the
+budget is spent where it helps most. With lang="auto" the script is detected
+once for the page and the retries reuse that language set.
+"""
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from language_detect import resolve_language
+from ocr_engine import get_engine
+from ocr_pipeline import with_source_dpi
+from preprocessing import run_pipeline, threshold
+from rich_output import WordTable
+
+MIN_CONFIDENCE = 60.0  # Lines whose mean word confidence is below this are retried
+LINE_PADDING = 6
+
+# Alternate readings of one line, cheapest first. Each takes the continuous-tone
+# crop (before binarisation) and returns the image handed to Tesseract.
+RETRY_LADDER = [
+    ("otsu", lambda crop: threshold(crop, method="otsu")),
+    ("sauvola", lambda crop: threshold(crop, method="sauvola", window=15)),
+    ("upscale_otsu", lambda crop: threshold(cv2.resize(crop, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC), method="otsu")),
+    ("tesseract_binarisation", lambda crop: crop),  # Let Tesseract's own Otsu decide
+]
+LINE_CONFIG = "--psm 7"  # Treat the crop as a single text line
+
+
+def split_stages(stages):
+    """
+    Splits a pipeline at its first threshold stage into (tone_stages,
+    threshold_stage). Stages after the threshold (crop_border) are dropped
+    so word boxes line up with the continuous-tone page the retries crop.
+    Returns (stages, None) if the pipeline never binarises.
+    """
+    for index, (name, params) in enumerate(stages):
+        if name == "threshold":
+            return stages[:index], [name, params]
+    return stages, None
+
+
+def _read(image, config, lang=None):
+    return WordTable.from_tsv(get_engine(lang).image_to_data(image, config=config))
+
+
+def ocr_with_retries(array, stages, budget=5.0, min_confidence=MIN_CONFIDENCE, timings=None, source_dpi=None, lang=None):
+    """
+    OCRs a decoded page (NumPy array) with the given preprocessing stages and
+    retries low-confidence lines until `budget` seconds have passed since the
+    call started. Returns (text, report).
+    """
+    started = time.monotonic()
+    deadline = started + budget
+    tone_stages, threshold_stage = split_stages(with_source_dpi(stages, source_dpi))
+    with metrics.span("preprocess"):
+        tone = run_pipeline(array, tone_stages, timings)
+        page = run_pipeline(tone, [threshold_stage], timings) if threshold_stage else tone
+    lang = resolve_language(page, lang)
+    with metrics.span("tesseract"):
+        words = _read(page, "", lang)
+
+    groups = words.line_groups()
+    line_texts = [" ".join(words.text[i] for i in group) for group in groups]
+    line_conf = [float(words.conf[group].mean()) for group in groups]
+    report = {
+        "lines": len(groups),
+        "low_confidence_lines": sum(conf < min_confidence for conf in line_conf),
+        "retried_lines": 0,
+        "improved_lines": 0,
+        "attempts": 0,
+        "budget_exhausted": False,
+        "mean_confidence_before": round(words.mean_confidence(), 1),
+        "lang": lang or "default",
+    }
+
+    height, width = tone.shape[:2]
+    with metrics.span("retry"):
+        for index in np.argsort(line_conf):
+            if line_conf[index] >= min_confidence:
+                break  # Sorted ascending, so every remaining line is fine
+            if time.monotonic() >= deadline:
+                report["budget_exhausted"] = True
+                break
+            group = groups[index]
+            left = max(int(words.left[group].min()) - LINE_PADDING, 0)
+            top = max(int(words.top[group].min()) - LINE_PADDING, 0)
+            right = min(int((words.left[group] + words.width[group]).max()) + LINE_PADDING, width)
+            bottom = min(int((words.top[group] + words.height[group]).max()) + LINE_PADDING, height)
+            crop = tone[top:bottom, left:right]
+
+            report["retried_lines"] += 1
+            improved = False
+            for name, transform in RETRY_LADDER:
+                if time.monotonic() >= deadline:
+                    report["budget_exhausted"] = True
+                    break
+                report["attempts"] += 1
+                metrics.inc("retry_attempts_total", step=name)
+                candidate = _read(transform(crop), LINE_CONFIG, lang)
+                if len(candidate) and candidate.mean_confidence() > line_conf[index]:
+                    line_texts[index] = " ".join(candidate.text)
+                    line_conf[index] = candidate.mean_confidence()
+                    improved = True
+                    if line_conf[index] >= min_confidence:
+                        break
+            if improved:
+                report["improved_lines"] += 1
+                metrics.inc("retry_improved_lines_total")
+            if report["budget_exhausted"]:
+                break
+
+    word_counts = [len(group) for group in groups]
+    report["mean_confidence_after"] = round(
+        float(np.average(line_conf, weights=word_counts)) if groups else 0.0, 1
+    )
+    report["seconds"] = round(time.monotonic() - started, 3)
+    return words.to_text(line_texts), report
@@ -0,0 +1,220 @@
+"""
+Structured OCR output: plain text, word boxes with confidences, a searchable
+PDF and a JSON export, all from a single Tesseract run.
+
+Word boxes are kept column-wise (one NumPy array per field) rather than as a
+list of per-word dicts, so a page of several thousand words stays compact and
+filters such as "words below 60% confidence" are single vectorised operations.
+
+Tesseract reads the preprocessed page (rescaled, deskewed, thresholded and
+possibly inverted), but the searchable PDF shows the upload itself. Tesseract
+writes an invisible text-only layer, which is mapped onto the upload through
+the preprocessing transform. The JSON records the same transform, so word
+boxes can be mapped back to the upload's pixels.
+"""
+import io
+import json
+import math
+import os
+
+import numpy as np
+from pytesseract.pytesseract import run_tesseract, save
+
+import metrics
+from language_detect import resolve_language
+from ocr_pipeline import EXIF_ORIENTATION, read_header
+
+# Tesseract writes these from one recognition pass; tsv is requested via -c
+OUTPUT_CONFIG = "-c tessedit_create_tsv=1"
+OUTPUT_EXTENSIONS = "txt pdf tsv"
+TEXT_ONLY_CONFIG = "-c textonly_pdf=1"  # Invisible text only; the upload is drawn underneath
+WORD_LEVEL = 5  # TSV `level` column: 1 page, 2 block, 3 paragraph, 4 line, 5 word
+DEFAULT_PAGE_DPI = 300  # PDF page size for uploads that don't record their resolution
+
+
+class WordTable:
+    """Words on a page as parallel arrays: text, box (left, top, width, height), confidence and layout ids."""
+
+    INT_COLUMNS = ("left", "top", "width", "height", "block_num", "par_num", "line_num", "word_num")
+
+    def __init__(self, text, conf, **columns):
+        self.text = list(text)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        for name in self.INT_COLUMNS:
+            setattr(self, name, np.asarray(columns.get(name, ()), dtype=np.int32))
+
+    @classmethod
+    def from_tsv(cls, tsv):
+        """Parses Tesseract's TSV output, keeping only recognised words."""
+        lines = tsv.splitlines()
+        if len(lines) < 2:
+            return cls([], [])
+        header = lines[0].split("\t")
+        rows = [line.split("\t") for line in lines[1:]]
+        # A word row has 12 fields; the text field is missing on empty rows
+        rows = [row for row in rows if len(row) == len(header) and int(row[0]) == WORD_LEVEL and row[-1].strip()]
+        if not rows:
+            return cls([], [])
+        columns = dict(zip(header, zip(*rows)))
+        return cls(
+            columns["text"],
+            np.array(columns["conf"], dtype=np.float32),
+            **{name: np.array(columns[name], dtype=np.int32) for name in cls.INT_COLUMNS},
+        )
+
+    def __len__(self):
+        return len(self.text)
+
+    def boxes(self):
+        """(n, 4) int32 array of left, top, width, height."""
+        return np.stack([self.left, self.top, self.width, self.height], axis=1) if len(self) else np.zeros((0, 4), np.int32)
+
+    def mean_confidence(self):
+        return float(self.conf.mean()) if len(self) else 0.0
+
+    def line_groups(self):
+        """Index arrays, one per text line, in Tesseract's reading order."""
+        if not len(self):
+            return []
+        keys = np.stack([self.block_num, self.par_num, self.line_num], axis=1)
+        starts = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+        return np.split(np.arange(len(self)), starts)
+
+    def to_text(self, line_texts=None):
+        """
+        Rebuilds page text: words joined by spaces, lines by newlines and
+        paragraphs by blank lines. `line_texts` optionally replaces the text
+        of each line (same order as line_groups()).
+        """
+        parts = []
+        previous_paragraph = None
+        for index, group in enumerate(self.line_groups()):
+            paragraph = (self.block_num[group[0]], self.par_num[group[0]])
+            if previous_paragraph is not None:
+                parts.append("\n\n" if paragraph != previous_paragraph else "\n")
+            previous_paragraph = paragraph
+            parts.append(line_texts[index] if line_texts is not None else " ".join(self.text[i] for i in group))
+        return "".join(parts)
+
+    def to_columns(self):
+        """JSON-ready dict of lists, one per column."""
+        columns = {"text": self.text, "conf": [round(float(conf), 2) for conf in self.conf]}
+        columns.update({name: getattr(self, name).tolist() for name in self.INT_COLUMNS})
+        return columns
+
+
+class RichResult:
+    """
+    One page's OCR artefacts. `transform` is the 3x3 matrix mapping the
+    upload's pixel coordinates to the OCR'd page's; word boxes are in the
+    latter.
+    """
+
+    def __init__(self, text, words, pdf, ocr_size, original_size=None, transform=None):
+        self.text = text
+        self.words = words
+        self.pdf = pdf
+        self.ocr_size = ocr_size
+        self.original_size = original_size or ocr_size
+        self.transform = np.eye(3) if transform is None else np.asarray(transform, dtype=np.float64)
+
+    def to_json(self):
+        return json.dumps({
+            "text": self.text,
+            "ocr_size": list(self.ocr_size),
+            "original_size": list(self.original_size),
+            "to_original": describe_transform(np.linalg.inv(self.transform)),
+            "mean_confidence": round(self.words.mean_confidence(), 2),
+            "words": self.words.to_columns(),
+        }, ensure_ascii=False).encode("utf-8")
+
+
+def describe_transform(matrix):
+    """
+    JSON form of a 3x3 affine matrix: the 2x3 `matrix` itself (x' = a*x + b*y + c,
+    y' = d*x + e*y + f) plus its scale, its rotation in degrees (clockwise on
+    screen, since image y points down) and its offset.
+    """
+    (a, b, c), (d, e, f) = matrix[:2]
+    return {
+        "matrix": [[round(float(value), 6) + 0.0 for value in row] for row in matrix[:2]],  # + 0.0 drops -0.0
+        "scale": [round(math.hypot(a, d), 6), round(math.hypot(b, e), 6)],
+        "rotation": round(math.degrees(math.atan2(d, a)), 4),
+        "offset": [round(float(c), 3), round(float(f), 3)],
+    }
+
+
+def overlay_text_layer(text_pdf, source, transform, ocr_size):
+    """
+    Builds the searchable PDF: the upload `source` as the visible page, with
+    Tesseract's invisible text-only page placed over it through `transform`
+    (upload pixels -> OCR pixels).
+    """
+    import pypdfium2 as pdfium
+    from PIL import Image, ImageOps
+
+    image_format, (width, height), dpi = read_header(source)
+    points = 72 / (dpi or DEFAULT_PAGE_DPI)  # Page points per upload pixel
+
+    pdf = pdfium.PdfDocument.new()
+    text_layer = pdfium.PdfDocument(text_pdf)
+    try:
+        page = pdf.new_page(width * points, height * points)
+        picture = pdfium.PdfImage.new(pdf)
+        with Image.open(io.BytesIO(source)) as image:
+            if image_format == "JPEG" and image.getexif().get(EXIF_ORIENTATION, 1) == 1:
+                picture.load_jpeg(io.BytesIO(source), inline=True)  # The scan's own bytes, not re-encoded
+            else:
+                picture.set_bitmap(pdfium.PdfBitmap.from_pil(ImageOps.exif_transpose(image)))
+        picture.set_matrix(pdfium.PdfMatrix().scale(width * points, height * points))
+        page.insert_obj(picture)
+
+        # PDF space has y pointing up: text page points -> OCR pixels -> upload pixels -> page points
+        text_width, text_height = text_layer.get_page_size(0)
+        from_text_page = np.array([
+            [ocr_size[0] / text_width, 0, 0], [0, -ocr_size[1] / text_height, ocr_size[1]], [0, 0, 1],
+        ])
+        to_page = np.array([[points, 0, 0], [0, -points, height * points], [0, 0, 1]])
+        matrix = to_page @ np.linalg.inv(transform) @ from_text_page
+        layer = text_layer.page_as_xobject(0, pdf).as_pageobject()
+        layer.set_matrix(pdfium.PdfMatrix(matrix[0, 0], matrix[1, 0], matrix[0, 1], matrix[1, 1], matrix[0, 2], matrix[1, 2]))
+        page.insert_obj(layer)
+        page.gen_content()
+
+        buffer = io.BytesIO()
+        pdf.save(buffer)
+        return buffer.getvalue()
+    finally:
+        text_layer.close()
+        pdf.close()
+
+
+def ocr_rich(image, config="", original_size=None, lang=None, source=None, transform=None):
+    """
+    Runs Tesseract once and returns a RichResult with text, word boxes and a
+    searchable PDF. This always uses the tesseract CLI (via pytesseract),
+    because libtesseract's in-process API has no PDF renderer exposed.
+
+    `source` is the upload's bytes, shown as the PDF's visible layer, and
+    `transform` maps its pixels to `image`'s (identity if None). Without a
+    source the PDF shows `image` itself.
+    """
+    array = np.asarray(image)
+    ocr_size = (array.shape[1], array.shape[0])
+    lang = resolve_language(array, lang) or os.environ.get("OCR_LANG", "eng")
+    transform = np.eye(3) if transform is None else transform
+    output_config = f"{OUTPUT_CONFIG} {TEXT_ONLY_CONFIG}" if source is not None else OUTPUT_CONFIG
+    with metrics.span("tesseract_rich"):
+        with save(image) as (temp_name, input_filename):
+            run_tesseract(input_filename, temp_name, OUTPUT_EXTENSIONS, lang, f"{config} {output_config}".strip())
+            with open(f"{temp_name}.txt", encoding="utf-8") as text_file:
+                text = text_file.read()
+            with open(f"{temp_name}.tsv", encoding="utf-8") as tsv_file:
+                words = WordTable.from_tsv(tsv_file.read())
+            with open(f"{temp_name}.pdf", "rb") as pdf_file:
+                pdf = pdf_file.read()
+    if source is not None:
+        with metrics.span("searchable_pdf"):
+            pdf = overlay_text_layer(pdf, source, transform, ocr_size)
+        original_size = original_size or read_header(source)[1]
+    return RichResult(text, words, pdf, ocr_size, original_size, transform)
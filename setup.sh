@@ -5,3 +5,11 @@ sudo apt-get update
 
 # Install Tesseract OCR
 sudo apt-get install -y tesseract-ocr
+
+# Language models for Sinhala and Tamil, plus OSD for script auto-detection
+sudo apt-get install -y tesseract-ocr-sin tesseract-ocr-tam tesseract-ocr-osd
+
+# Optional: libtesseract headers and a compiler for tesserocr, which keeps Tesseract warm in-process
+# instead of forking a tesseract subprocess per image. Without it the app falls back to pytesseract.
+sudo apt-get install -y libtesseract-dev libleptonica-dev pkg-config build-essential
+pip install -r requirements-tesserocr.txt
@@ -0,0 +1,385 @@
+"""
+Durable submission spool. Every Submit is written to a local SQLite database
+first (WAL journal with synchronous=FULL, so the commit is an fsync), and a
+background SpoolDispatcher delivers it to Google Sheets and Drive afterwards.
+The user waits for one local transaction; a Google outage only grows the
+backlog, and the backlog survives restarts.
+
+Each submission has an idempotency key. Sheets rows carry it as a trailing
+column and Drive files as a private property, so a retry after an ambiguous
+failure (the write landed but the response was lost) is detected instead of
+duplicated. Failed deliveries back off exponentially; after `max_attempts`
+they are dead-lettered: kept with their last error until `requeue_dead()`.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SHEETS_KEY_COLUMN = 4  # After reference number, rating and errors
+
+
+class Delivery:
+    """One pending write of a submission to one service."""
+
+    def __init__(self, delivery_id, submission, kind, ref_number, payload, attempts, redelivery):
+        self.delivery_id = delivery_id
+        self.submission = submission
+        self.kind = kind
+        self.ref_number = ref_number
+        self.payload = payload
+        self.attempts = attempts  # Including the current one
+        self.redelivery = redelivery  # An earlier attempt may already have reached the service
+
+
+class SubmissionSpool:
+    """
+    Append-only SQLite store of deliveries. A submission becomes one "sheets"
+    delivery (the row) and, when it has files, one "drive" delivery whose file
+    contents are stored as blobs until the upload completes.
+    """
+
+    def __init__(self, path="submission_spool.sqlite3"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")  # WAL's default (NORMAL) skips the fsync on commit
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, submission TEXT NOT NULL, kind TEXT NOT NULL, "
+            "ref_number TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, last_error TEXT, "
+            "created REAL NOT NULL, finished REAL, UNIQUE (submission, kind));"
+            "CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (kind, status, next_attempt);"
+            "CREATE TABLE IF NOT EXISTS delivery_files ("
+            "delivery_id INTEGER NOT NULL, position INTEGER NOT NULL, title TEXT NOT NULL, "
+            "mime_type TEXT NOT NULL, data BLOB NOT NULL, PRIMARY KEY (delivery_id, position));"
+        )
+
+    def recover_interrupted(self):
+        """
+        Makes deliveries left 'running' by a process that died mid-delivery
+        due again. Only the dispatcher that owns the spool calls this, once at
+        startup: any other instance (a tool, a test, a second process) would
+        take back work a live dispatcher is still delivering. Returns how many
+        were recovered.
+        """
+        with self._lock:
+            return self._db.execute("UPDATE deliveries SET status = 'pending' WHERE status = 'running'").rowcount
+
+    def submit(self, ref_number, row, files=(), meta=None, key=None):
+        """
+        Durably records a submission and returns its idempotency key. `files`
+        are (title, bytes, mime type) for Drive; `meta` is handed back to the
+        dispatcher's on_drive_done. Submitting an existing key again is a no-op.
+        """
+        key = key or uuid.uuid4().hex
+        now = time.time()
+        with self._lock, metrics.span("spool_submit"):
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(key, "sheets", ref_number, {"row": list(row)}, now)
+                if files:
+                    delivery_id = self._insert(key, "drive", ref_number, {"meta": meta}, now)
+                    if delivery_id is not None:
+                        self._db.executemany(
+                            "INSERT INTO delivery_files (delivery_id, position, title, mime_type, data) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            [(delivery_id, position, title, mime_type, data)
+                             for position, (title, data, mime_type) in enumerate(files)],
+                        )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        metrics.inc("spool_submissions_total")
+        return key
+
+    def claim(self, kind, limit, now=None):
+        """Marks up to `limit` due deliveries of `kind` as running and returns them, oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, submission, kind, ref_number, payload, attempts, last_error FROM deliveries "
+                "WHERE kind = ? AND status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (kind, now, limit),
+            ).fetchall()
+            if rows:
+                self._db.executemany(
+                    "UPDATE deliveries SET status = 'running', attempts = attempts + 1 WHERE id = ?",
+                    [(row[0],) for row in rows],
+                )
+        return [
+            Delivery(delivery_id, submission, kind, ref_number, json.loads(payload), attempts + 1,
+                     redelivery=attempts > 0 or last_error is not None)  # last_error survives requeue_dead
+            for delivery_id, submission, kind, ref_number, payload, attempts, last_error in rows
+        ]
+
+    def due(self, kind, now=None):
+        """Number of deliveries of `kind` waiting to be claimed now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM deliveries WHERE kind = ? AND status = 'pending' AND next_attempt <= ?",
+                (kind, now),
+            ).fetchone()[0]
+
+    def files(self, delivery_id):
+        """[(title, bytes, mime type), ...] of a drive delivery, in submit order."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT title, data, mime_type FROM delivery_files WHERE delivery_id = ? ORDER BY position",
+                (delivery_id,),
+            ).fetchall()
+
+    def complete(self, delivery_id):
+        """Marks a delivery done and drops its file blobs."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "UPDATE deliveries SET status = 'done', finished = ?, last_error = NULL WHERE id = ?",
+                (time.time(), delivery_id),
+            )
+            self._db.execute("DELETE FROM delivery_files WHERE delivery_id = ?", (delivery_id,))
+            self._db.execute("COMMIT")
+
+    def fail(self, delivery_id, error, retry_at=None):
+        """Schedules a retry at `retry_at`, or dead-letters the delivery when it is None."""
+        with self._lock:
+            if retry_at is None:
+                self._db.execute(
+                    "UPDATE deliveries SET status = 'dead', finished = ?, last_error = ? WHERE id = ?",
+                    (time.time(), error, delivery_id),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE deliveries SET status = 'pending', next_attempt = ?, last_error = ? WHERE id = ?",
+                    (retry_at, error, delivery_id),
+                )
+
+    def requeue_dead(self, kind=None):
+        """Gives dead-lettered deliveries a fresh set of attempts. Returns how many were requeued."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE deliveries SET status = 'pending', attempts = 0, next_attempt = ?, finished = NULL "
+                "WHERE status = 'dead' AND (? IS NULL OR kind = ?)",
+                (time.time(), kind, kind),
+            )
+            return cursor.rowcount
+
+    def status(self, key):
+        """{kind: (status, attempts, last_error)} for one submission."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, status, attempts, last_error FROM deliveries WHERE submission = ?", (key,)
+            ).fetchall()
+        return {kind: (status, attempts, error) for kind, status, attempts, error in rows}
+
+    def counts(self):
+        """{(kind, status): count} over the whole spool."""
+        with self._lock:
+            rows = self._db.execute("SELECT kind, status, COUNT(*) FROM deliveries GROUP BY kind, status").fetchall()
+        return {(kind, status): count for kind, status, count in rows}
+
+    def import_jsonl_rows(self, path):
+        """
+        Moves rows left in the JSON-lines spool of the old buffered Sheets
+        writer (one row per line) into this spool and deletes the file. Keys derive from the line number, so an import
+        interrupted by a crash is not duplicated when it runs again.
+        """
+        if not os.path.exists(path):
+            return 0
+        imported = 0
+        with open(path, encoding="utf-8") as legacy:
+            for number, line in enumerate(legacy):
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash mid-write
+                self.submit(row[0] if row else "", row, key=f"{os.path.basename(path)}:{number}")
+                imported += 1
+        os.remove(path)
+        return imported
+
+    def purge_done(self, older_than=86400):
+        """Deletes delivered entries finished more than `older_than` seconds ago."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM deliveries WHERE status = 'done' AND finished < ?", (time.time() - older_than,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _insert(self, key, kind, ref_number, payload, now):
+        """Returns the new delivery id, or None if this submission already has one. Caller holds self._lock."""
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO deliveries (submission, kind, ref_number, payload, next_attempt, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, str(ref_number), json.dumps(payload), now, now),
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+
+class SpoolDispatcher:
+    """
+    Background thread draining a SubmissionSpool. Sheets rows are sent in one
+    `append_rows` call every `sheets_batch_size` rows or `sheets_flush_interval`
+    seconds; Drive deliveries go through a DriveUploadQueue, at most
+    `max_drive_in_flight` at a time so file blobs are read from the spool
+    only as uploads start.
+
+    `open_worksheet` is called on the first Sheets flush and its worksheet
+    reused until a write fails; pass fakes.FakeWorksheet / fakes.FakeDrive for local testing.
+    """
+
+    def __init__(self, spool, open_worksheet, upload_queue, on_drive_done=None, max_attempts=8, backoff=5.0,
+                 max_backoff=600.0, poll_interval=1.0, sheets_batch_size=20, sheets_flush_interval=5.0,
+                 max_drive_in_flight=8):
+        self.spool = spool
+        self.open_worksheet = open_worksheet
+        self.upload_queue = upload_queue
+        self.on_drive_done = on_drive_done
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.sheets_batch_size = sheets_batch_size
+        self.sheets_flush_interval = sheets_flush_interval
+        self.max_drive_in_flight = max_drive_in_flight
+        self.last_error = {}  # kind -> message of the latest failed delivery
+        self._worksheet = None
+        self._last_sheets_flush = 0.0
+        self._drive_in_flight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        recovered = spool.recover_interrupted()
+        if recovered:
+            logger.warning("Resuming %d deliveries interrupted by a restart", recovered)
+        self._thread = threading.Thread(target=self._run, name="spool-dispatcher", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Dispatches without waiting for the next poll, e.g. right after a submit."""
+        self._wake.set()
+
+    def dispatch(self, force_sheets=False):
+        """One pass over the spool: due Sheets rows, then due Drive uploads."""
+        now = time.monotonic()
+        due_rows = self.spool.due("sheets")
+        if due_rows and (force_sheets or due_rows >= self.sheets_batch_size
+                         or now - self._last_sheets_flush >= self.sheets_flush_interval):
+            self._last_sheets_flush = now
+            while self._deliver_sheets() == self.sheets_batch_size:
+                pass  # Drain a backlog in full batches
+        with self._lock:
+            room = self.max_drive_in_flight - self._drive_in_flight
+        if room > 0:
+            for delivery in self.spool.claim("drive", room):
+                self._deliver_drive(delivery)
+        for (kind, status), count in self.spool.counts().items():
+            metrics.set_gauge("spool_deliveries", count, kind=kind, status=status)
+
+    def close(self, timeout=None):
+        """Stops the thread after a final pass; undelivered entries stay in the spool."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        last_purge = 0.0
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.dispatch(force_sheets=self._stopped.is_set())
+                if time.monotonic() - last_purge > 3600:
+                    self.spool.purge_done()
+                    last_purge = time.monotonic()
+            except Exception:
+                logger.exception("Submission spool dispatch failed")
+
+    def _deliver_sheets(self):
+        """Sends one batch of rows. Returns the number of deliveries claimed."""
+        deliveries = self.spool.claim("sheets", self.sheets_batch_size)
+        if not deliveries:
+            return 0
+        try:
+            with metrics.span("sheets_append"):
+                if self._worksheet is None:
+                    self._worksheet = self.open_worksheet()
+                pending = deliveries
+                if any(delivery.redelivery for delivery in deliveries):
+                    # An earlier append may have landed before its response was lost
+                    landed = set(self._worksheet.col_values(SHEETS_KEY_COLUMN))
+                    pending = [delivery for delivery in deliveries if delivery.submission not in landed]
+                    metrics.inc("spool_duplicates_skipped_total", len(deliveries) - len(pending), kind="sheets")
+                if pending:
+                    self._worksheet.append_rows([delivery.payload["row"] + [delivery.submission] for delivery in pending])
+        except Exception as e:
+            self._worksheet = None  # Re-open (and re-authorise) on the next attempt
+            logger.warning("Google Sheets delivery of %d rows failed: %s", len(deliveries), e)
+            for delivery in deliveries:
+                self._failed(delivery, str(e))
+            return 0
+        for delivery in deliveries:
+            self.spool.complete(delivery.delivery_id)
+        metrics.inc("sheets_rows_written_total", len(pending))
+        metrics.inc("sheets_requests_total")
+        self.last_error.pop("sheets", None)
+        return len(deliveries)
+
+    def _deliver_drive(self, delivery):
+        files = self.spool.files(delivery.delivery_id)
+
+        def done(job):
+            self.spool.complete(delivery.delivery_id)
+            self._drive_finished()
+            self.last_error.pop("drive", None)
+            if self.on_drive_done is not None:
+                self.on_drive_done(delivery)
+
+        def failed(job):
+            self._failed(delivery, job.error)
+            self._drive_finished()
+
+        with self._lock:
+            self._drive_in_flight += 1
+        try:
+            self.upload_queue.submit(
+                delivery.ref_number, files, on_done=done, on_failed=failed,
+                idempotency_key=delivery.submission, resume=delivery.redelivery,
+            )
+        except Exception as e:  # The queue was shut down
+            self._failed(delivery, str(e))
+            self._drive_finished()
+
+    def _drive_finished(self):
+        with self._lock:
+            self._drive_in_flight -= 1
+        self._wake.set()  # Room for the next upload
+
+    def _failed(self, delivery, error):
+        self.last_error[delivery.kind] = error
+        if delivery.attempts >= self.max_attempts:
+            self.spool.fail(delivery.delivery_id, error)
+            metrics.inc("spool_dead_letters_total", kind=delivery.kind)
+            logger.error("Giving up on %s delivery for %s after %d attempts: %s",
+                         delivery.kind, delivery.ref_number, delivery.attempts, error)
+            return
+        delay = min(self.backoff * 2 ** (delivery.attempts - 1), self.max_backoff) * (0.5 + random.random())
+        self.spool.fail(delivery.delivery_id, error, retry_at=time.time() + delay)
+        metrics.inc("spool_retries_total", kind=delivery.kind)
@@ -0,0 +1,68 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from drive_uploader import IDEMPOTENCY_PROPERTY, DriveUploadQueue
+from fakes import FakeDrive
+from folder_index import FOLDER_MIME_TYPE
+
+FILES = [(f"page-{index}.txt", f"text {index}".encode(), "text/plain") for index in range(3)]
+
+
+def file_keys(drive):
+    """Counter of idempotency keys over the uploaded (non-folder) files."""
+    return Counter(
+        prop['value']
+        for metadata, _ in drive.files.values() if metadata['mimeType'] != FOLDER_MIME_TYPE
+        for prop in metadata.get('properties', []) if prop['key'] == IDEMPOTENCY_PROPERTY
+    )
+
+
+@pytest.fixture
+def upload():
+    """upload(queue, **submit_kwargs) -> finished job; shuts the queues down afterwards."""
+    queues = []
+
+    def run(queue, **kwargs):
+        queues.append(queue)
+        finished = threading.Event()
+        job_id = queue.submit("REF-1", FILES, on_done=lambda job: finished.set(),
+                              on_failed=lambda job: finished.set(), **kwargs)
+        assert finished.wait(10), "upload did not finish"
+        return queue.job(job_id)
+
+    yield run
+    for queue in queues:
+        queue.shutdown()
+
+
+def test_lost_responses_do_not_duplicate_files(upload):
+    drive = FakeDrive(lost_response_rate=1.0)
+    job = upload(DriveUploadQueue(drive, "root", max_retries=2, backoff=0), idempotency_key="k")
+
+    assert job.status == "done"
+    assert file_keys(drive) == {f"k-{index}": 1 for index in range(len(FILES))}
+    assert sum(metadata['mimeType'] == FOLDER_MIME_TYPE for metadata, _ in drive.files.values()) == 1
+
+
+def test_resumed_job_skips_files_already_uploaded(upload):
+    drive = FakeDrive()
+    upload(DriveUploadQueue(drive, "root", backoff=0), idempotency_key="k")
+    calls = drive.calls
+
+    job = upload(DriveUploadQueue(drive, "root", backoff=0), idempotency_key="k", resume=True)
+
+    assert job.status == "done"
+    assert file_keys(drive) == {f"k-{index}": 1 for index in range(len(FILES))}
+    assert drive.calls - calls == 1 + len(FILES)  # Folder lookup, then one key lookup per file
+
+
+def test_job_fails_after_max_retries(upload):
+    drive = FakeDrive(failure_rate=1.0)
+    job = upload(DriveUploadQueue(drive, "root", max_retries=2, backoff=0), idempotency_key="k")
+
+    assert job.status == "failed"
+    assert job.attempts == 3
+    assert "injected" in job.error
+    assert drive.files == {}
@@ -0,0 +1,80 @@
+import threading
+
+from fakes import FakeDrive, FakeDriveError
+from folder_index import FOLDER_MIME_TYPE, FolderIndex
+
+
+def folders(drive):
+    return [metadata for metadata, _ in drive.files.values() if metadata['mimeType'] == FOLDER_MIME_TYPE]
+
+
+def lookup_concurrently(index, threads=8):
+    """Runs get_or_create for one reference from several threads at once; returns results or exceptions."""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def lookup(slot):
+        barrier.wait()
+        try:
+            results[slot] = index.get_or_create("root", "REF-1")
+        except Exception as e:
+            results[slot] = e
+
+    workers = [threading.Thread(target=lookup, args=(slot,)) for slot in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_concurrent_lookups_share_one_create():
+    drive = FakeDrive(latency=0.2)
+    results = lookup_concurrently(FolderIndex(drive))
+
+    assert len(folders(drive)) == 1
+    assert set(results) == {folders(drive)[0]['id']}
+    assert drive.calls == 2  # One ListFile, one folder Upload
+
+
+def test_failed_lookup_reaches_every_waiter_and_is_not_cached():
+    drive = FakeDrive(latency=0.2, failure_rate=1.0)
+    index = FolderIndex(drive)
+    results = lookup_concurrently(index)
+
+    assert all(isinstance(result, FakeDriveError) for result in results)
+    assert drive.calls == 1
+
+    drive.failure_rate = 0.0
+    folder_id = index.get_or_create("root", "REF-1")
+    assert [folder['id'] for folder in folders(drive)] == [folder_id]
+
+
+def test_cached_folder_skips_drive():
+    drive = FakeDrive()
+    index = FolderIndex(drive)
+    folder_id = index.get_or_create("root", "REF-1")
+    calls = drive.calls
+
+    assert index.get_or_create("root", "REF-1") == folder_id
+    assert drive.calls == calls
+
+
+def test_mirror_keeps_folder_across_instances(tmp_path):
+    drive = FakeDrive()
+    path = str(tmp_path / "folders.sqlite3")
+    folder_id = FolderIndex(drive, sqlite_path=path).get_or_create("root", "REF-1")
+    calls = drive.calls
+
+    assert FolderIndex(drive, sqlite_path=path).get_or_create("root", "REF-1") == folder_id
+    assert drive.calls == calls
+
+
+def test_expired_mirror_entry_is_looked_up_again(tmp_path):
+    drive = FakeDrive()
+    path = str(tmp_path / "folders.sqlite3")
+    folder_id = FolderIndex(drive, ttl=0, sqlite_path=path).get_or_create("root", "REF-1")
+    calls = drive.calls
+
+    assert FolderIndex(drive, ttl=0, sqlite_path=path).get_or_create("root", "REF-1") == folder_id
+    assert drive.calls == calls + 1  # Found by ListFile, not created again